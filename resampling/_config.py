@@ -1,10 +1,16 @@
 import os
-import toml
+import functools
 from dacite import from_dict
 from dataclasses import dataclass
 
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import toml
+    tomllib = None
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Settings:
     """
     Settings class.
@@ -16,6 +22,38 @@ class Settings:
     aws_session_token: str
 
 
+def _load_settings(filename: str) -> Settings:
+    """
+    Parse a toml file into Settings.
+
+    The result is cached per path and modification time, so every Config
+    created for an unchanged file shares a single parse, while an updated
+    file (e.g. with refreshed session tokens) is parsed again.
+
+    :param filename: string, path to toml file.
+    :return: Settings.
+    """
+    filename = os.path.abspath(filename)
+    return _parse_settings(filename, os.stat(filename).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_settings(filename: str, mtime: int) -> Settings:
+    """
+    Parse a toml file into Settings, see `_load_settings`.
+
+    :param filename: string, absolute path to toml file.
+    :param mtime: int, modification time of the file in nanoseconds.
+    :return: Settings.
+    """
+    if tomllib is None:
+        data = toml.load(filename)
+    else:
+        with open(filename, "rb") as f:
+            data = tomllib.load(f)
+    return from_dict(data_class=Settings, data=dict(data))
+
+
 class Config:
     """
     Config class.
@@ -51,8 +89,7 @@ class Config:
         :param filename: string, path to toml file.
         :return: None
         """
-        self._settings = from_dict(data_class=Settings,
-                                   data=dict(toml.load(filename)))
+        self._settings = _load_settings(filename)
 
     @property
     def config_file(self) -> str:
@@ -1,4 +1,3 @@
-import itertools
 import numpy as np
 import xarray as xr
 from typing import Any
@@ -28,17 +27,10 @@ def _handle_datetime_dimension(
         step: np.timedelta64, invert: bool
 ) -> Tuple[List[np.datetime64], List[int]]:
 
-    intervals = []
-    indices = []
-    index = 0
-    current = start
-
-    while current < stop:
-        next_interval = min(current + step, stop)
-        intervals.append([current, next_interval])
-        indices.append(index)
-        current = next_interval
-        index += 1
+    lower = np.arange(start, stop, step)
+    upper = np.minimum(lower + step, stop)
+    intervals = [list(pair) for pair in np.column_stack([lower, upper])]
+    indices = list(range(len(intervals)))
 
     if invert:
         intervals = intervals[::-1]
@@ -53,28 +45,26 @@ def _handle_numeric_dimension(
         invert: bool
 ) -> Tuple[List[Union[float, List[float]]], List[int]]:
 
-    intervals = []
-    indices = []
-    index = 0
-    current = start
-
     if start == stop:
-        intervals.append(start)
-        indices.append(index)
+        intervals = [start]
     elif abs(stop - start) < step:
-        intervals.append([start, stop])
-        indices.append(index)
+        intervals = [[start, stop]]
     else:
-        while current < stop:
-            next_interval = min(current + step, stop)
-            intervals.append([current, next_interval])
-            indices.append(index)
-            current = next_interval
-            index += 1
+        # An explicit count rather than a float arange, which can add a lower
+        # bound at (or just past) `stop` through rounding, e.g. for
+        # (1.0, 1.3, 0.1); this matches the count of `_centre_coordinates`.
+        # A descending range (stop < start) has no intervals.
+        n = max(int(np.ceil(round((stop - start) / step, 9))), 0)
+        # Consecutive intervals share their bounds, the last ends at `stop`
+        edges = np.append(np.linspace(start, start + n * step, n,
+                                      endpoint=False), stop)
+        intervals = np.column_stack([edges[:-1], edges[1:]]).tolist()
 
         if invert:
             intervals = intervals[::-1]
 
+    indices = list(range(len(intervals)))
+
     return intervals, indices
 
 
@@ -147,12 +137,50 @@ def _get_missing_dimensions(
     return dimensions, dimension_indices
 
 
+def _interval_bounds(
+        intervals: List[Union[int, float, np.datetime64, List[Any]]]
+) -> np.ndarray:
+    """
+    Converts the intervals of one dimension into an (n_intervals, 2) array of
+    [start, end] bounds. Single values (scalars or one-element lists) become
+    intervals with equal start and end.
+    """
+    bounds = np.asarray(intervals)
+    if bounds.ndim == 1:
+        bounds = bounds[:, np.newaxis]
+    return bounds[:, [0, -1]]
+
+
+def _label_positions(coord: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """
+    Translates [start, end] label bounds into [lo, hi) integer positions
+    along a monotonic coordinate, selecting the same elements as
+    `ds.sel({dim: slice(start, end)})` would (bounds are inclusive).
+
+    :param coord: The 1D (monotonic) coordinate values of a dimension.
+    :type coord: numpy.ndarray
+    :param bounds: An (n, 2) array of [start, end] label bounds.
+    :type bounds: numpy.ndarray
+    :return: An (n, 2) integer array of [lo, hi) positions.
+    :rtype: numpy.ndarray
+    """
+    n = coord.size
+    if n > 1 and coord[0] > coord[-1]:
+        descending = coord[::-1]
+        lo = n - np.searchsorted(descending, bounds[:, 0], side='right')
+        hi = n - np.searchsorted(descending, bounds[:, 1], side='left')
+    else:
+        lo = np.searchsorted(coord, bounds[:, 0], side='left')
+        hi = np.searchsorted(coord, bounds[:, 1], side='right')
+    return np.stack([lo, np.maximum(hi, lo)], axis=1)
+
+
 def _define_windows(
         resampler: List[Dict[str, Any]],
         ds: xr.Dataset
     ) -> Tuple[
-        List[Dict[str, Union[int, float, List[Union[int, float]]]]],
-        List[Dict[str, int]],
+        np.ndarray,
+        np.ndarray,
         Dict[str, List[Union[int, List[Union[int, float]]]]]
     ]:
     """
@@ -160,6 +188,11 @@ def _define_windows(
     resampler configuration, and includes any dimensions present in the dataset
     but not specified in the resampler.
 
+    Windows are returned as structured arrays with one field per dimension
+    (struct-of-arrays), so a batch of windows is a contiguous slice and a
+    single dimension of a batch, e.g. ``windows['latitude'][i:j]``, is a
+    plain NumPy array.
+
     :param resampler: A list of dictionaries specifying the resampling
     parameters for each dimension.
         Each dictionary must include:
@@ -177,16 +210,16 @@ def _define_windows(
     :type ds: xarray.Dataset
 
     :return: A tuple containing;
-        A list of dictionaries where each dictionary represents a combination
-        of intervals for each dimension.
-        A list of dictionaries where each dictionary represents a combination
-        of indices for each dimension.
+        A structured array with one record per window, where each field
+        holds the [start, end] bounds of that window for one dimension.
+        A structured array with one record per window, where each field
+        holds the index of the interval of that window for one dimension.
         A dictionary where keys are dimension names and values are lists of
         intervals for each dimension.
 
     :rtype: Tuple[
-        List[Dict[str, Union[int, float, List[Union[int, float]]]]],
-        List[Dict[str, int]],
+        numpy.ndarray,
+        numpy.ndarray,
         Dict[str, List[Union[int, List[Union[int, float]]]]]
         ]
     """
@@ -209,20 +242,25 @@ def _define_windows(
     dimensions.update(missing_dimensions)
     dimension_indices.update(missing_indices)
 
-    # Generate combinations
-    all_combinations = list(itertools.product(*dimensions.values()))
-    index_combinations = list(itertools.product(*dimension_indices.values()))
+    # Generate combinations, in the same order as itertools.product
+    index_grids = np.meshgrid(
+        *[np.asarray(indices, dtype=np.int64)
+          for indices in dimension_indices.values()],
+        indexing="ij"
+    )
 
-    dims_with_coords = [
-        {dim: window for dim, window in zip(dimensions.keys(), combination)}
-        for combination in all_combinations
-    ]
+    bounds = {dim: _interval_bounds(intervals)
+              for dim, intervals in dimensions.items()}
 
-    dims_with_indices = [
-        {dim: index for dim, index in
-         zip(dimension_indices.keys(), combination)}
-        for combination in index_combinations
-    ]
+    dims_with_indices = np.empty(
+        index_grids[0].size,
+        dtype=[(dim, np.int64) for dim in dimension_indices])
+    dims_with_coords = np.empty(
+        index_grids[0].size,
+        dtype=[(dim, bounds[dim].dtype, (2,)) for dim in dimensions])
 
-    return dims_with_coords, dims_with_indices, dimensions
+    for dim, grid in zip(dimension_indices, index_grids):
+        dims_with_indices[dim] = grid.ravel()
+        dims_with_coords[dim] = bounds[dim][dims_with_indices[dim]]
 
+    return dims_with_coords, dims_with_indices, dimensions
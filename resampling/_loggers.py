@@ -1,4 +1,6 @@
-import time
+import os
+import queue
+import atexit
 import psutil
 import logging
 import threading
@@ -7,6 +9,8 @@ import multiprocessing
 from typing import Any
 from typing import Callable
 from typing import Optional
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
 
 
 def setup_logger(log_file: Optional[str] = "log_events.log") -> logging.Logger:
@@ -27,28 +31,74 @@ def setup_logger(log_file: Optional[str] = "log_events.log") -> logging.Logger:
     :raises ValueError: If the log file path is invalid or cannot be created.
 
     .. note::
-        If the logger already has handlers, they will be cleared before
-        adding the new file handler. Ensure that the log file path is writable.
+        If the logger already writes to `log_file`, it is returned as is.
+        Otherwise its handlers are closed and removed before adding the new
+        file handler, which writes from a background thread. Ensure that the
+        log file path is writable.
     """
     # Create a logger instance
     logger = logging.getLogger('EventLogger')
     logger.setLevel(logging.INFO)
 
+    # Reuse the logger if it already writes to this file
+    if _has_file_handler(logger, log_file):
+        return logger
+
     # Remove existing handlers if any
-    if logger.hasHandlers():
-        logger.handlers.clear()
+    _close_handlers(logger)
 
-    # Create a file handler for the logger
-    thread_monitor_handler = logging.FileHandler(log_file)
+    # Add a file handler that writes from a background thread, so logging
+    # calls never block on disk
+    logger.addHandler(_QueuedFileHandler(log_file))
 
-    # Create a formatter and set it for the handler
-    thread_monitor_formatter = logging.Formatter('%(asctime)s - %(message)s')
-    thread_monitor_handler.setFormatter(thread_monitor_formatter)
+    return logger
 
-    # Add the handler to the logger
-    logger.addHandler(thread_monitor_handler)
 
-    return logger
+class _QueuedFileHandler(QueueHandler):
+    """
+    Logs to a file from a background thread: records are put on a queue and
+    written by a `QueueListener`, so logging never blocks on disk. Pending
+    records are written when the handler is closed, at the latest at exit.
+    """
+
+    def __init__(self, log_file: str):
+        super().__init__(queue.SimpleQueue())
+        self.baseFilename = os.path.abspath(log_file)
+
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(
+            logging.Formatter('%(asctime)s - %(message)s'))
+        self._listener = QueueListener(self.queue, file_handler)
+        self._listener.start()
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            atexit.unregister(self.close)
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+        super().close()
+
+
+def _has_file_handler(logger: logging.Logger, log_file: str) -> bool:
+    """
+    Checks whether the logger has a file handler writing to `log_file`.
+    """
+    path = os.path.abspath(log_file)
+    return any(isinstance(handler, (logging.FileHandler, _QueuedFileHandler))
+               and handler.baseFilename == path
+               for handler in logger.handlers)
+
+
+def _close_handlers(logger: logging.Logger) -> None:
+    """
+    Closes and removes all handlers of the logger, releasing their files.
+    """
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
 
 
 class ResourceMonitor:
@@ -69,19 +119,22 @@ class ResourceMonitor:
         self._logger = logging.getLogger('MonitorLogger')
         self._logger.setLevel(logging.INFO)
 
-        # Remove existing handlers if any
-        if self._logger.hasHandlers():
-            self._logger.handlers.clear()
+        # Reuse the handler if the logger already writes to this file,
+        # otherwise remove existing handlers if any
+        if not _has_file_handler(self._logger, log_file):
+            _close_handlers(self._logger)
 
-        # Create and configure file handler
-        thread_monitor_handler = logging.FileHandler(log_file)
-        thread_monitor_formatter = (
-            logging.Formatter('%(asctime)s - %(message)s'))
-        thread_monitor_handler.setFormatter(thread_monitor_formatter)
-        self._logger.addHandler(thread_monitor_handler)
+            # Records are written from a background thread, so the
+            # monitoring thread never blocks on disk
+            self._logger.addHandler(_QueuedFileHandler(log_file))
 
         self._logger.info("Starting new run")
 
+        # Set to stop the monitoring thread, see `stop_monitor_resources`
+        self._stop = threading.Event()
+        self._process = psutil.Process()
+        self._cpu = multiprocessing.cpu_count()
+
     def _log_function(self, func: Callable) -> Callable:
         """
         Decorator to log the execution time and errors of a function.
@@ -96,14 +149,17 @@ class ResourceMonitor:
         """
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            self._logger.info(f"Started {func.__name__}")
+            log_info = self._logger.isEnabledFor(logging.INFO)
+            if log_info:
+                self._logger.info("Started %s", func.__name__)
             try:
                 result = func(*args, **kwargs)
-                self._logger.info(f"Finished {func.__name__}")
+                if log_info:
+                    self._logger.info("Finished %s", func.__name__)
                 return result
-            except Exception as e:
-                self._logger.error(f"Error in {func.__name__}")
-                self._logger.error(f"Error: {e}")
+            except Exception:
+                # Logs the error together with its traceback
+                self._logger.exception("Error in %s", func.__name__)
                 raise
         return wrapper
 
@@ -124,16 +180,20 @@ class ResourceMonitor:
         """
         while True:
             active_threads = threading.active_count()
-            memory_info = psutil.Process().memory_info()
-            memory_usage = memory_info.rss / (1024 * 1024 * 1024)  # Convert to GB
-            cpu = multiprocessing.cpu_count()
+            # Reads the process info once for all queried values
+            with self._process.oneshot():
+                memory_info = self._process.memory_info()
+            memory_usage = memory_info.rss / (1 << 30)  # Convert to GB
+            cpu = self._cpu
 
             self._logger.info(
                 f"Active threads: {active_threads}, "
                 f"Memory usage: {memory_usage:.2f} GB, "
                 f"CPU: {cpu}"
             )
-            time.sleep(interval)
+            # Returns early (True) once the monitor is stopped
+            if self._stop.wait(interval):
+                break
 
     def start_monitor_resources(self, interval: int = 60) -> threading.Thread:
         """
@@ -149,6 +209,7 @@ class ResourceMonitor:
         :return: Thread object for the monitoring thread.
         :rtype: threading.Thread
         """
+        self._stop.clear()
         monitor_thread = threading.Thread(
             target=lambda: self._count_resources(interval=interval),
             daemon=True
@@ -156,3 +217,13 @@ class ResourceMonitor:
         monitor_thread.start()
         return monitor_thread
 
+    def stop_monitor_resources(self) -> None:
+        """
+        Stop the monitoring thread started by `start_monitor_resources`. The
+        thread wakes up and exits right away, instead of after its interval.
+
+        :return: None
+        :rtype: None
+        """
+        self._stop.set()
+
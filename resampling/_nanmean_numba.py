@@ -0,0 +1,106 @@
+import numpy as np
+from typing import Optional
+
+try:
+    from numba import njit
+    from numba import prange
+    from numba import config
+    from numba import set_num_threads
+except ModuleNotFoundError:
+    njit = None
+
+_HAS_NUMBA = njit is not None
+
+# The kernel checks every value for NaN, so the 'nnan' and 'ninf' fastmath
+# flags must stay off; the remaining ones allow the sums to vectorize.
+_FASTMATH = {"reassoc", "contract", "nsz", "arcp"}
+_KERNEL_NDIM = 3
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _batch_nanmean_3d(
+            arr: np.ndarray,
+            starts: np.ndarray,
+            stops: np.ndarray
+    ) -> np.ndarray:
+        n_windows = starts.shape[0]
+        means = np.empty(n_windows, dtype=np.float64)
+
+        for w in prange(n_windows):
+            total = 0.0
+            count = 0
+            for i in range(starts[w, 0], stops[w, 0]):
+                for j in range(starts[w, 1], stops[w, 1]):
+                    for k in range(starts[w, 2], stops[w, 2]):
+                        value = arr[i, j, k]
+                        if not np.isnan(value):
+                            total += value
+                            count += 1
+            means[w] = total / count if count > 0 else np.nan
+
+        return means
+
+
+def _batch_nanmean_numpy(
+        arr: np.ndarray,
+        starts: np.ndarray,
+        stops: np.ndarray
+) -> np.ndarray:
+    # Every window is reduced on its own values, so (unlike differences of
+    # cumulative sums) an inf or a very large value in one window does not
+    # affect the others; the sums release the GIL
+    means = np.full(len(starts), np.nan)
+    for w, (start, stop) in enumerate(zip(starts, stops)):
+        values = arr[tuple(map(slice, start, stop))]
+        valid = ~np.isnan(values)
+        count = np.count_nonzero(valid)
+        if count > 0:
+            means[w] = values.sum(where=valid, dtype=np.float64) / count
+    return means
+
+
+def batch_nanmean(
+        arr: np.ndarray,
+        starts: np.ndarray,
+        stops: np.ndarray,
+        workers: Optional[int] = None
+) -> np.ndarray:
+    """
+    Computes the mean of the non-NaN values of `arr` within each window.
+
+    Windows are given as integer [start, stop) positions along every axis of
+    `arr`. If numba is installed, arrays of up to three dimensions are reduced
+    with a parallel compiled kernel; otherwise (or for arrays with more
+    dimensions) the windows are reduced one by one with NumPy.
+
+    :param arr: The values to reduce.
+    :type arr: numpy.ndarray
+    :param starts: An (n_windows, arr.ndim) integer array of start positions.
+    :type starts: numpy.ndarray
+    :param stops: An (n_windows, arr.ndim) integer array of stop positions.
+    :type stops: numpy.ndarray
+    :param workers: The number of threads used by the compiled kernel,
+        defaults to all available threads.
+    :type workers: Optional[int]
+    :return: The mean of every window, NaN for windows without valid values.
+    :rtype: numpy.ndarray
+    """
+    if not np.issubdtype(arr.dtype, np.floating):
+        arr = arr.astype(np.float64)
+    starts = np.asarray(starts, dtype=np.int64).reshape(len(starts), arr.ndim)
+    stops = np.asarray(stops, dtype=np.int64).reshape(len(stops), arr.ndim)
+
+    if not _HAS_NUMBA or arr.ndim > _KERNEL_NDIM:
+        return _batch_nanmean_numpy(arr, starts, stops)
+
+    # Pad with leading length-1 axes so a single kernel handles 1D to 3D
+    pad = _KERNEL_NDIM - arr.ndim
+    arr = np.ascontiguousarray(arr).reshape((1,) * pad + arr.shape)
+    starts = np.hstack([np.zeros((len(starts), pad), np.int64), starts])
+    stops = np.hstack([np.ones((len(stops), pad), np.int64), stops])
+
+    if workers is not None:
+        set_num_threads(max(1, min(workers, config.NUMBA_NUM_THREADS)))
+
+    return _batch_nanmean_3d(arr, starts, stops)
@@ -1,8 +1,12 @@
-import time
+import logging
+import operator
 import numpy as np
 import xarray as xr
-import pandas as pd
-import datetime as dt
+from functools import partial
+from functools import reduce
+from functools import lru_cache
+from collections import deque
+from contextlib import nullcontext
 from typing import Dict
 from typing import List
 from typing import Union
@@ -11,13 +15,26 @@ from typing import Optional
 from tenacity import retry
 from tenacity import wait_exponential
 from tenacity import stop_after_attempt
-from concurrent.futures import as_completed
+from tenacity import retry_if_exception_type
 from concurrent.futures import ThreadPoolExecutor
 
 from resampling._loggers import setup_logger
 from resampling._loggers import ResourceMonitor
 from resampling.object_store import ObjectStore
 from resampling._define_windows import _define_windows
+from resampling._define_windows import _interval_bounds
+from resampling._define_windows import _label_positions
+from resampling._nanmean_numba import batch_nanmean
+from resampling._nanmean_numba import _HAS_NUMBA
+
+# Maximum number of batches waiting to be written
+_WRITE_QUEUE_DEPTH = 2
+# Number of source chunks fetched at once when loading a block. Reads from
+# S3 are latency-bound, so this is well above the number of cores.
+_READ_CONCURRENCY = 64
+# Maximum number of source cells of which the validity is held in memory at
+# once by `_valid_windows` (as booleans, so 256 MB)
+_MASK_SLAB_CELLS = 2 ** 28
 
 
 def down_scale_on_the_fly(
@@ -54,39 +71,96 @@ def down_scale_on_the_fly(
         invert = spec.get('invert', False)  # Default to False if not specified
 
         # Compute the new coordinates to be at the centers of the intervals
-        if step > 0:
-            new_coords[dimension] = np.arange(range_start + step / 2,
-                                              range_end + step / 2, step)
-        else:
-            new_coords[dimension] = np.arange(range_start + step / 2,
-                                              range_end + step / 2, step)
+        new_coords[dimension] = _centre_coordinates(step, range_start,
+                                                    range_end, invert)
 
         if new_coords[dimension].size == 0:
             raise ValueError(
                 f"Generated new coordinates for {dimension} are empty. Check the range and step values.")
 
-        # Reverse the coordinates if invert is True
         if invert:
-            new_coords[dimension] = new_coords[dimension][::-1]
             slices[dimension] = slice(range_end, range_start, -1)
         else:
             slices[dimension] = slice(range_start, range_end)
 
     ds_sliced = ds.sel(**slices)
 
-    ds_reindexed = ds_sliced
-    for dim in new_coords:
-        if dim in ds_sliced.dims:
-            if ds_sliced[dim].size > 0:
-                ds_reindexed = ds_reindexed.interp({dim: new_coords[dim]},
-                                                   method='nearest')
-
+    new_coords = {dim: coords for dim, coords in new_coords.items()
+                  if dim in ds_sliced.dims and ds_sliced[dim].size > 0}
+
+    # Nearest neighbour positions per dimension, gathered from all
+    # dimensions at once with a single (outer) isel
+    indexers = {}
+    outside = {}
+    for dim, coords in new_coords.items():
+        source = ds_sliced[dim].values
+        indexers[dim] = ds_sliced.indexes[dim].get_indexer(coords,
+                                                           method='nearest')
+        outside[dim] = xr.DataArray(
+            (coords < source.min()) | (coords > source.max()), dims=dim)
+
+    ds_reindexed = ds_sliced.isel(indexers).assign_coords(new_coords)
+
+    # Coordinates outside the source range are left empty (NaN)
+    for name, da in ds_reindexed.data_vars.items():
+        masks = [outside[dim] for dim in da.dims if dim in outside]
+        if any(mask.values.any() for mask in masks):
+            ds_reindexed[name] = da.where(~reduce(operator.or_, masks))
+
+    # isel keeps the dimension order of every variable, so only transpose
+    # when a variable is not in the original order
     original_order = list(ds.dims)
-    ds_reindexed = ds_reindexed.transpose(*original_order)
+    if any(da.dims != tuple(dim for dim in original_order if dim in da.dims)
+           for da in ds_reindexed.variables.values()):
+        ds_reindexed = ds_reindexed.transpose(*original_order)
 
     return ds_reindexed
 
 
+@lru_cache(maxsize=128)
+def _cached_centre_coordinates(
+        step: float,
+        range_start: float,
+        range_end: float,
+        invert: bool
+) -> Tuple[float, ...]:
+    # linspace over an explicit count: unlike a float arange, rounding in
+    # (range_end - range_start) / step cannot add or drop a centre
+    n = int(np.ceil(np.round((range_end - range_start) / step, 9)))
+    first = range_start + step / 2
+    centres = np.linspace(first, first + (n - 1) * step, max(n, 0))
+    if invert:
+        centres = centres[::-1]
+    return tuple(centres.tolist())
+
+
+def _centre_coordinates(
+        step: float,
+        range_start: float,
+        range_end: float,
+        invert: bool
+) -> np.ndarray:
+    """
+    Returns the centres of the intervals of a resampled dimension, in
+    descending order if `invert` is True. Results are cached, so repeated
+    calls with the same resampler do not regenerate them; every call returns
+    a new array.
+
+    :param step: The step size of the resampling.
+    :type step: float
+    :param range_start: The start of the range of the dimension.
+    :type range_start: float
+    :param range_end: The end of the range of the dimension.
+    :type range_end: float
+    :param invert: Whether to invert the coordinates.
+    :type invert: bool
+    :return: The centres of the intervals.
+    :rtype: numpy.ndarray
+    """
+    return np.array(_cached_centre_coordinates(step, range_start, range_end,
+                                               bool(invert)))
+
+
 def down_scale_in_batches(
     ds: xr.Dataset,
     my_store: ObjectStore,
@@ -99,6 +173,8 @@ def down_scale_in_batches(
     over_write: Optional[bool] = True,
     start_batch: Optional[int] = None,
     end_batch: Optional[int] = None,
+    skip_empty: Optional[bool] = False,
+    dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]] = None,
 ) -> None:
     """
     Downscale the dataset in batches and store the results in a Zarr format.
@@ -145,6 +221,22 @@ def down_scale_in_batches(
         Whether to log progress messages. Defaults to True.
     :type logs: Optional[bool]
 
+    :param skip_empty:
+        Whether to first compute which windows contain any valid (non-NaN)
+        value, so that empty windows are neither read nor written. This
+        costs one pass over the variable (as booleans) and pays off for
+        sparse data, e.g. ocean variables with land masked out. Defaults to
+        False.
+    :type skip_empty: Optional[bool]
+
+    :param dtype_spec:
+        Variables to store quantized in the destination Zarr, as (integer
+        dtype, scale_factor, add_offset), e.g. {"thetao": ("int16", 0.001,
+        15.0)}. This shrinks the stored (and transferred) bytes, at the
+        precision of scale_factor. Defaults to storing all variables as
+        floats.
+    :type dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]]
+
     :return:
         None
     :rtype: None
@@ -154,20 +246,65 @@ def down_scale_in_batches(
     1. It starts resource monitoring and sets up logging.
     2. It calculates the necessary windows and indices for processing the dataset.
     3. It checks if the target Zarr store exists. If it does, the store is deleted and recreated.
-    4. It iteratively processes each variable by:
-       * Splitting the dataset into windows of data.
-       * Downscaling the data within each window using multithreading.
-       * Writing the downscaled data to the Zarr store in batches.
-    5. Logs the progress and completion of each batch and variable.
+    4. It iteratively processes the windows in batches by:
+       * Reading the block of source data covering the batch once, for all
+         variables together.
+       * Downscaling the data within each window, with a single `coarsen`
+         when the windows tile the dataset in equally sized blocks, or
+         with a parallel (numba) kernel on the block read otherwise.
+       * Writing the downscaled data of all variables to the Zarr store in
+         one go, on a background thread so the next batch is computed
+         meanwhile.
+    5. Logs the progress and completion of each batch.
+    """
+    resource_monitor = None
+    if logs:
+        resource_monitor = ResourceMonitor()
+        resource_monitor.start_monitor_resources()
+
+    # The monitoring thread is stopped when the run ends, also if it fails
+    try:
+        _down_scale_batches(ds=ds,
+                            my_store=my_store,
+                            dest_zarr=dest_zarr,
+                            resampler=resampler,
+                            variables=variables,
+                            batch_size=batch_size,
+                            workers=workers,
+                            logs=logs,
+                            over_write=over_write,
+                            start_batch=start_batch,
+                            end_batch=end_batch,
+                            skip_empty=skip_empty,
+                            dtype_spec=dtype_spec)
+    finally:
+        if resource_monitor is not None:
+            resource_monitor.stop_monitor_resources()
+
+
+def _down_scale_batches(
+    ds: xr.Dataset,
+    my_store: ObjectStore,
+    dest_zarr: str,
+    resampler: List[Dict[str, Union[str, float, Tuple[float, float], bool]]],
+    variables: List[str],
+    batch_size: int,
+    workers: int,
+    logs: bool,
+    over_write: bool,
+    start_batch: Optional[int],
+    end_batch: Optional[int],
+    skip_empty: bool,
+    dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]],
+) -> None:
+    """
+    Runs the batches of `down_scale_in_batches`, see there for the
+    parameters.
     """
     if start_batch is None:
         start_batch = 0  # Start from the beginning
-    if end_batch is None:
-        end_batch = float('inf')
 
     if logs:
-        resource_monitor = ResourceMonitor()
-        resource_monitor.start_monitor_resources()
         logger = setup_logger()
 
         logger.info(f"Downscaling to dataset: {dest_zarr}")
@@ -183,200 +320,575 @@ def down_scale_in_batches(
                             f" a new empyt zarr will be created")
             my_store.delete_zarr(dest_zarr)
 
+    # Means are stored with the precision of the source variables
+    dtypes = {var: _mean_dtype(ds[var].dtype) for var in variables}
+
     my_store.create_empty_zarr(zarr_name=dest_zarr,
                                coordinate_ranges=dimensions,
-                               variables=variables)
+                               variables=variables,
+                               dtypes=dtypes,
+                               dtype_spec=dtype_spec)
     total_windows = len(windows)
+    batch_n = -(-total_windows // batch_size)
+    if end_batch is None:
+        end_batch = batch_n - 1  # Run up to the last batch
 
-    for variable in variables:
-        for i in range(0, total_windows, batch_size):
-
-            batch_i = int(i / batch_size)
-            # print(batch_i)
+    # Translate the intervals to integer positions once for all windows, and
+    # gather the [start, stop) positions of every window along every dimension
+    positions = _dimension_positions(ds, dimensions)
+    window_dims = indices.dtype.names
+    starts, stops = _window_positions(window_dims, positions, indices)
 
-            if not start_batch <= batch_i <= end_batch:
-                # print('skip')
-                continue
+    # Regular resamplers can be reduced with one coarsen per batch
+    blocks = _regular_blocks(positions)
 
-            batch_n = int(np.ceil(total_windows / batch_size))
-            if logs:
-                logger.info(f">> Working on VAR {variable} - "
-                            f"batch {batch_i + 1}/{batch_n}:"
-                            f"windows [{i}-{i + batch_size}]/{total_windows}")
+    coarse_variables = []
+    valid = {}
+    for variable in variables:
+        if blocks is not None and set(ds[variable].dims) <= blocks.keys():
+            coarse_variables.append(variable)
+        elif skip_empty:
+            valid[variable] = _valid_windows(ds, variable, positions)
+    kernel_variables = [var for var in variables
+                        if var not in coarse_variables]
+
+    # Batches are written in the background while the next ones are
+    # computed; the writes lock the destination chunks they update, so
+    # several batches can be in flight at once.
+    # Without numba the means are computed with NumPy, which releases the GIL
+    # in its reductions, so the variables of a batch are averaged
+    # concurrently. The compiled kernel is parallel over the windows already.
+    # Their thread pool is only started in that case.
+    parallel_variables = not _HAS_NUMBA and len(kernel_variables) > 1
+    with ThreadPoolExecutor(max_workers=_WRITE_QUEUE_DEPTH) as writer, \
+            (ThreadPoolExecutor(max_workers=workers) if parallel_variables
+             else nullcontext()) as variable_pool:
+        pending_writes = deque()
+
+        # Only the requested batches are visited, skipped ones never enter
+        # the loop
+        batch_ids = range(max(start_batch, 0), min(end_batch + 1, batch_n))
+        log_batches = logs and logger.isEnabledFor(logging.INFO)
+        for batch_i in batch_ids:
+            i = batch_i * batch_size
+            # print(batch_i)
 
-                print(f">> Working on VAR {variable} - "
-                      f"batch {batch_i + 1}/{batch_n}:"
-                      f"windows [{i}-{i + batch_size}]/{total_windows}")
+            if log_batches:
+                # One line per variable, in the format `plot_logs` parses
+                for variable in variables:
+                    message = (f">> Working on VAR {variable} - "
+                               f"batch {batch_i + 1}/{batch_n}:"
+                               f"windows [{i}-{i + batch_size}]/"
+                               f"{total_windows}")
+                    logger.info(message)
+                    print(message)
 
-            batch_of_windows = windows[i:i + batch_size]
             batch_of_indices = indices[i:i + batch_size]
 
-            means = _get_means_threaded(ds=ds,
-                                        var=variable,
-                                        windows=batch_of_windows,
-                                        workers=workers,
-                                        offset=i,
-                                        )
-            # means = _get_means_looped(ds=ds,
-            #                           var=variable,
-            #                           windows=batch_of_windows,
-            #                           offset=i)
-            # print("__")
-            # print(means)
-
-            # Write the batch to the Zarr store
-            my_store.write_zarr_batch(
+            batch_valid = {
+                var: mask[tuple(batch_of_indices[dim] for dim in ds[var].dims)]
+                for var, mask in valid.items()}
+
+            # Average the regular variables with one coarsen of the batch
+            coarse_means = {}
+            if coarse_variables:
+                coarse_means = _get_means_coarsened(
+                    ds=ds,
+                    variables=coarse_variables,
+                    blocks=blocks,
+                    dims=window_dims,
+                    starts=starts[i:i + batch_size],
+                    stops=stops[i:i + batch_size],
+                )
+
+            # Read the source block of the batch once for all variables
+            block, offsets = None, None
+            if kernel_variables:
+                block, offsets = _load_block(
+                    ds=ds,
+                    variables=kernel_variables,
+                    dims=window_dims,
+                    starts=starts[i:i + batch_size],
+                    stops=stops[i:i + batch_size],
+                    valid=_any_valid(batch_valid, kernel_variables),
+                )
+
+            get_means = partial(
+                _variable_means,
+                ds=ds,
+                coarse_means=coarse_means,
+                block=block,
+                offsets=offsets,
+                dims=window_dims,
+                starts=starts[i:i + batch_size],
+                stops=stops[i:i + batch_size],
+                valid=batch_valid,
+                workers=workers,
+            )
+            if parallel_variables:
+                batch_means = dict(zip(variables,
+                                       variable_pool.map(get_means,
+                                                         variables)))
+            else:
+                batch_means = {variable: get_means(variable)
+                               for variable in variables}
+
+            # Write the batch of all variables to the Zarr store at once, in
+            # the background while the next batch is computed
+            if len(pending_writes) >= _WRITE_QUEUE_DEPTH:
+                pending_writes.popleft().result()
+            pending_writes.append(writer.submit(
+                my_store.write_zarr_batch_multi,
                 zarr_store_path=dest_zarr,
-                variable_name=variable,
-                batch_values=means,
-                indexes=batch_of_indices)
-        if logs:
-            logger.info(f">> Finished VAR {variable}")
+                batch_values=batch_means,
+                indexes=batch_of_indices))
+
+        while pending_writes:
+            pending_writes.popleft().result()
+    if logs:
+        logger.info(f">> Finished VARS {', '.join(variables)}")
+
+
+def _variable_means(
+        variable: str,
+        ds: xr.Dataset,
+        coarse_means: Dict[str, np.ndarray],
+        block: Optional[xr.Dataset],
+        offsets: Optional[Dict[str, int]],
+        dims: Tuple[str, ...],
+        starts: np.ndarray,
+        stops: np.ndarray,
+        valid: Dict[str, np.ndarray],
+        workers: int
+) -> np.ndarray:
+    """
+    Computes the means of one variable for the windows of a batch, either by
+    taking its coarsened means or with the compiled kernel on the block of
+    the batch.
+
+    :param variable: The variable to average.
+    :type variable: str
+    :param ds: The source dataset.
+    :type ds: xarray.Dataset
+    :param coarse_means: The means of the batch of the regular variables,
+        see `_get_means_coarsened`.
+    :type coarse_means: Dict[str, numpy.ndarray]
+    :param block: The in-memory block of the batch, see `_load_block`.
+    :type block: Optional[xarray.Dataset]
+    :param offsets: The start position of the block per dimension.
+    :type offsets: Optional[Dict[str, int]]
+    :param dims: The dimensions the columns of `starts` and `stops` refer to.
+    :type dims: Tuple[str, ...]
+    :param starts: The (n_windows, n_dims) start positions of the windows.
+    :type starts: numpy.ndarray
+    :param stops: The (n_windows, n_dims) stop positions of the windows.
+    :type stops: numpy.ndarray
+    :param valid: The masks of the windows holding valid values, per
+        variable (if known).
+    :type valid: Dict[str, numpy.ndarray]
+    :param workers: The number of threads used by the kernel.
+    :type workers: int
+    :return: The mean of every window of the batch.
+    :rtype: numpy.ndarray
+    """
+    if variable in coarse_means:
+        return coarse_means[variable]
+
+    means = _get_means_jitted(
+        block=block,
+        offsets=offsets,
+        var=variable,
+        dims=dims,
+        starts=starts,
+        stops=stops,
+        workers=workers,
+        valid=valid.get(variable),
+        dtype=_mean_dtype(ds[variable].dtype),
+    )
+    return means
 
 
-def _convert_to_datetime(slice_range):
-    start, end = slice_range
-    start_date = pd.Timestamp(dt.datetime(start, 1, 1))
-    end_date = pd.Timestamp(dt.datetime(end, 1, 1))
-    return start_date, end_date
+def _mean_dtype(dtype: np.dtype) -> np.dtype:
+    """
+    Returns the dtype in which the means of a variable are stored: floating
+    point variables keep their precision (e.g. float32 stays float32), other
+    variables are averaged to float64.
+
+    :param dtype: The dtype of the source variable.
+    :type dtype: numpy.dtype
+    :return: The dtype of the means.
+    :rtype: numpy.dtype
+    """
+    if np.issubdtype(dtype, np.floating):
+        return np.dtype(dtype)
+    return np.dtype(np.float64)
 
 
-def _slice_dataset(ds: xr.Dataset,
-                   window:
-                   List[Dict[str, Union[int, float, List[Union[int, float]]]]]
-                   ) -> xr.Dataset:
+def _dimension_positions(
+        ds: xr.Dataset,
+        dimensions: Dict[str, list]
+) -> Dict[str, np.ndarray]:
     """
-    Slice an `xarray.Dataset` based on the specified coordinate ranges for 
-    each dimension.
+    Translates the intervals of every dimension into integer [start, stop)
+    positions along the coordinates of the dataset. This is done once per
+    dimension, so windows only need to look up the positions of their
+    intervals by index.
 
-    :param ds: The `xarray.Dataset` to slice.
+    :param ds: The source dataset.
     :type ds: xarray.Dataset
-    :param window: A list of dictionaries where each dictionary specifies
-        the range for a dimension. Each dictionary should have:
-        - The key as the dimension name.
-        - The value as the range, which can be:
-            - A single value (int or float).
-            - A list or tuple with one value.
-            - A list or tuple with two values specifying the start and end 
-            of the range.
-    :type window: list of dicts, where each dict contains:
-        - **Dimension name** (str): The name of the dimension.
-        - **Range** (Union[int, float, list of Union[int, float]]): 
-            - A single value (int or float) for exact coordinates.
-            - A list or tuple with one value for a single range.
-            - A list or tuple with two values specifying the start and end 
-              of the range.
-    :return: The sliced `xarray.Dataset`.
-    :rtype: xarray.Dataset
+    :param dimensions: The intervals per dimension, as returned by
+        `_define_windows`.
+    :type dimensions: Dict[str, list]
+    :return: Per dimension, an (n_intervals, 2) integer array of positions.
+    :rtype: Dict[str, numpy.ndarray]
     """
-    dim_names = list(ds.dims)
-    slices = {}
+    return {dim: _label_positions(ds[dim].values, _interval_bounds(intervals))
+            for dim, intervals in dimensions.items()}
 
-    for dim_name in dim_names:
-        if dim_name in window:
-            value_range = window[dim_name]
-            if isinstance(value_range, (list, tuple)) and len(
-                    value_range) == 1:
-                start = end = value_range[0]
-            elif isinstance(value_range, (int, float, np.datetime64)):
-                start = end = value_range
-            else:
-                start, end = value_range
-            slices[dim_name] = slice(start, end)
-
-    sliced_ds = ds.sel(**slices)
-    return sliced_ds
-
-
-# @retry(stop=stop_after_attempt(5),
-#        wait=wait_exponential(multiplier=1, min=4, max=10))
-def _process_window(i, window, var, ds, offset, max_retries=5, retry_delay=10):
-    # print(window)
-    global_counter = i + offset
-    retries = 0
-
-    while retries < max_retries:
-        try:
-            sliced_ds = _slice_dataset(ds, window)
-            # print(sliced_ds)
-            if var in sliced_ds:
-                # print(1)
-                values = sliced_ds[var].values
-                # print('-')
-                if len(values) == 0 or np.isnan(values).all():
-                    # print(2)
-                    mean = np.nan
-                else:
-                    mean = np.nanmean(values)
-                    # print(3)
-            else:
-                mean = np.nan
-            # print(global_counter)
-            # print(mean)
-            return global_counter, mean
-
-        except Exception as e:
-            # print('going in exception')
-            # print(e)
-            retries += 1
-            if retries >= max_retries:
-                mean = np.nan
-                print(f"Error in process window {window}")
-                print(e)
-                return global_counter, mean
-            else:
-                print(e)
-                print(f"Error in process window {window}.")
-                print(e)
-                print(f"Retrying ({retries}/{max_retries})...")
-                time.sleep(retry_delay)
-
-
-# @retry(stop=stop_after_attempt(5),
-#        wait=wait_exponential(multiplier=1, min=4, max=10))
-def _get_means_threaded(ds, var, windows, workers, offset=0):
-    results = [None] * len(windows)
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-
-        futures = {
-            executor.submit(_process_window, i, window, var, ds, offset):
-                i for i, window in enumerate(windows)
-        }
-
-        for future in as_completed(futures):
-            try:
-                global_counter, result = future.result()
-                results[global_counter - offset] = result
-            except RecursionError as e:
-                print(f"RecursionError encountered: {e}")
-                raise
-            except Exception as e:
-                print(f"Error encountered: {e}")
-                raise
-
-    means = np.array(results)
-    means = np.where(np.isnan(means), np.nan, means.astype(float))
 
-    return means
+def _regular_blocks(
+        positions: Dict[str, np.ndarray]
+) -> Optional[Dict[str, int]]:
+    """
+    Checks whether the windows tile every dimension of the dataset in equally
+    sized, non-overlapping blocks of source cells, in which case all window
+    means can be computed with a single `coarsen`.
+
+    :param positions: The positions of the intervals per dimension, as
+        returned by `_dimension_positions`.
+    :type positions: Dict[str, numpy.ndarray]
+    :return: The block size per dimension, or None if the windows are not
+        regular.
+    :rtype: Optional[Dict[str, int]]
+    """
+    blocks = {}
+    for dim, dim_positions in positions.items():
+        reverse = (len(dim_positions) > 1
+                   and dim_positions[0, 0] > dim_positions[-1, 0])
+        if reverse:
+            dim_positions = dim_positions[::-1]
+
+        width = dim_positions[0, 1] - dim_positions[0, 0]
+        if width < 1 or not (
+                np.all(dim_positions[:, 1] - dim_positions[:, 0] == width)
+                and np.all(dim_positions[1:, 0] == dim_positions[:-1, 1])):
+            return None
+
+        blocks[dim] = int(width)
+    return blocks
+
+
+def _get_means_coarsened(
+        ds: xr.Dataset,
+        variables: List[str],
+        blocks: Dict[str, int],
+        dims: Tuple[str, ...],
+        starts: np.ndarray,
+        stops: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Computes the means of the windows of a batch for variables whose windows
+    are the regular blocks found by `_regular_blocks`, with a single
+    `coarsen` of the bounding box of the batch for all variables. The
+    coarsened means are computed and loaded with `_load_values`, so failed
+    reads are retried.
 
+    :param ds: The source dataset.
+    :type ds: xarray.Dataset
+    :param variables: The variables to reduce.
+    :type variables: List[str]
+    :param blocks: The block size per dimension.
+    :type blocks: Dict[str, int]
+    :param dims: The dimensions the columns of `starts` and `stops` refer to.
+    :type dims: Tuple[str, ...]
+    :param starts: The (n_windows, n_dims) start positions of the windows.
+    :type starts: numpy.ndarray
+    :param stops: The (n_windows, n_dims) stop positions of the windows.
+    :type stops: numpy.ndarray
+    :return: The mean of every window of the batch, per variable.
+    :rtype: Dict[str, numpy.ndarray]
+    """
+    block_dims = set(dim for var in variables for dim in ds[var].dims)
+    columns = {dim: k for k, dim in enumerate(dims) if dim in block_dims}
+    lower = {dim: int(starts[:, k].min()) for dim, k in columns.items()}
+    upper = {dim: int(stops[:, k].max()) for dim, k in columns.items()}
+
+    # The bounding box of the batch starts at a block, so it holds a whole
+    # number of blocks
+    coarse = ds[variables].isel(
+        {dim: slice(lower[dim], upper[dim]) for dim in columns})
+    coarse = coarse.coarsen({dim: blocks[dim] for dim in columns})
+    coarse = _load_values(coarse.mean(skipna=True), variables, {})
+
+    # The coarsened cell of every window, per dimension
+    cells = {dim: (starts[:, k] - lower[dim]) // blocks[dim]
+             for dim, k in columns.items()}
+    return {var: np.asarray(
+        coarse[var].values[tuple(cells[dim] for dim in ds[var].dims)],
+        dtype=_mean_dtype(ds[var].dtype)) for var in variables}
+
+
+def _any_within(
+        valid: np.ndarray,
+        dim_positions: np.ndarray,
+        axis: int
+) -> np.ndarray:
+    """
+    Reduces a boolean array along one axis to whether any value is True
+    within each [start, stop) interval of positions.
+
+    :param valid: The boolean array to reduce.
+    :type valid: numpy.ndarray
+    :param dim_positions: An (n_intervals, 2) integer array of positions.
+    :type dim_positions: numpy.ndarray
+    :param axis: The axis to reduce.
+    :type axis: int
+    :return: The reduced array, with n_intervals elements along `axis`.
+    :rtype: numpy.ndarray
+    """
+    # reduceat over the interleaved [start, stop, start, stop, ...] edges
+    # reduces every [start, stop) at the even positions. A trailing False
+    # makes stop positions at the end of the axis valid edges.
+    pad_width = [(0, 0)] * valid.ndim
+    pad_width[axis] = (0, 1)
+    padded = np.pad(valid, pad_width, constant_values=False)
+
+    reduced = np.logical_or.reduceat(padded, dim_positions.ravel(),
+                                     axis=axis)
+    reduced = np.take(reduced, np.arange(0, reduced.shape[axis], 2),
+                      axis=axis)
+
+    # reduceat returns the element at start for empty intervals
+    empty = dim_positions[:, 1] <= dim_positions[:, 0]
+    shape = [1] * valid.ndim
+    shape[axis] = len(empty)
+    return reduced & ~empty.reshape(shape)
+
+
+def _valid_windows(
+        ds: xr.Dataset,
+        var: str,
+        positions: Dict[str, np.ndarray]
+) -> np.ndarray:
+    """
+    Computes whether each window contains any valid (non-NaN) value of a
+    variable. The variable is read once, in slabs along its first dimension
+    of at most `_MASK_SLAB_CELLS` cells, which are reduced one dimension at
+    a time; only the validity (booleans) of one slab is held in memory.
 
-def _get_means_looped(ds, var, windows, offset=0):
-    results = [None] * len(windows)
+    :param ds: The source dataset.
+    :type ds: xarray.Dataset
+    :param var: The variable to check.
+    :type var: str
+    :param positions: The positions of the intervals per dimension, as
+        returned by `_dimension_positions`.
+    :type positions: Dict[str, numpy.ndarray]
+    :return: A boolean array with one axis per dimension of the variable (in
+        the order of `ds[var].dims`), indexed by window index.
+    :rtype: numpy.ndarray
+    """
+    dims = ds[var].dims
+    mask = ds[[var]].notnull()
+    if not dims:
+        return np.asarray(mask[var].values)
+
+    # Slabs hold consecutive intervals of the first dimension, so each source
+    # row is read once (or twice, for rows on a shared interval bound)
+    first = positions[dims[0]]
+    row_cells = int(np.prod([ds.sizes[dim] for dim in dims[1:]]))
+    slab_rows = max(1, _MASK_SLAB_CELLS // max(row_cells, 1))
+
+    valid = np.zeros([len(positions[dim]) for dim in dims], dtype=bool)
+    order = np.argsort(first[:, 0], kind="stable")
+    k = 0
+    while k < len(order):
+        lower = first[order[k], 0]
+        upper = max(first[order[k], 1], lower)
+        n = 1
+        while (k + n < len(order)
+               and max(upper, first[order[k + n], 1]) - lower <= slab_rows):
+            upper = max(upper, first[order[k + n], 1])
+            n += 1
+        group = order[k:k + n]
+        k += n
+
+        slab = _load_values(mask, [var],
+                            {dims[0]: slice(int(lower), int(upper))})[var]
+        slab_valid = _any_within(slab.values, first[group] - lower, 0)
+        for axis, dim in enumerate(dims[1:], start=1):
+            slab_valid = _any_within(slab_valid, positions[dim], axis)
+        valid[group] = slab_valid
+    return valid
+
+
+@retry(retry=retry_if_exception_type(OSError),
+       stop=stop_after_attempt(5),
+       wait=wait_exponential(multiplier=1, min=4, max=10),
+       reraise=True)
+def _load_values(
+        ds: xr.Dataset,
+        variables: List[str],
+        slices: Dict[str, slice]
+) -> xr.Dataset:
+    """
+    Loads a block of variables into memory with a single read (one dask
+    computation for all variables), retrying when reading from the (remote)
+    source fails. Up to `_READ_CONCURRENCY` chunks are fetched concurrently.
 
-    # Using a simple for loop to process each window sequentially
-    for i, window in enumerate(windows):
-        try:
-            global_counter, result = _process_window(i, window, var, ds, offset)
-            results[global_counter - offset] = result
-        except RecursionError as e:
-            print(f"RecursionError encountered: {e}")
-            raise
-        except Exception as e:
-            print(f"Error encountered: {e}")
-            raise
+    :param ds: The source dataset.
+    :type ds: xarray.Dataset
+    :param variables: The variables to load.
+    :type variables: List[str]
+    :param slices: The integer slices of the block per dimension.
+    :type slices: Dict[str, slice]
+    :return: The in-memory block.
+    :rtype: xarray.Dataset
+    """
+    return ds[variables].isel(slices).load(num_workers=_READ_CONCURRENCY)
 
-    # Convert the results to a NumPy array and handle NaN values
-    means = np.array(results)
-    means = np.where(np.isnan(means), np.nan, means.astype(float))
 
+def _any_valid(
+        batch_valid: Dict[str, np.ndarray],
+        variables: List[str]
+) -> Optional[np.ndarray]:
+    """
+    Combines the validity masks of a batch into the windows that hold valid
+    values for any of the variables, or None if not every variable has a
+    mask (in which case all windows are needed).
+    """
+    if not variables or not all(var in batch_valid for var in variables):
+        return None
+    return np.logical_or.reduce([batch_valid[var] for var in variables])
+
+
+def _load_block(
+        ds: xr.Dataset,
+        variables: List[str],
+        dims: Tuple[str, ...],
+        starts: np.ndarray,
+        stops: np.ndarray,
+        valid: Optional[np.ndarray] = None
+) -> Tuple[Optional[xr.Dataset], Optional[Dict[str, int]]]:
+    """
+    Loads the bounding box of the windows of a batch for all given variables
+    with a single read, instead of reading the source once per window and
+    variable.
+
+    :param ds: The source dataset.
+    :type ds: xarray.Dataset
+    :param variables: The variables to load.
+    :type variables: List[str]
+    :param dims: The dimensions the columns of `starts` and `stops` refer to.
+    :type dims: Tuple[str, ...]
+    :param starts: The (n_windows, n_dims) start positions of the windows.
+    :type starts: numpy.ndarray
+    :param stops: The (n_windows, n_dims) stop positions of the windows.
+    :type stops: numpy.ndarray
+    :param valid: Which windows need to be read, defaults to all of them.
+    :type valid: Optional[numpy.ndarray]
+    :return: The in-memory block and its start position per dimension, or
+        (None, None) if no window needs to be read.
+    :rtype: Tuple[Optional[xarray.Dataset], Optional[Dict[str, int]]]
+    """
+    block_dims = set(dim for var in variables for dim in ds[var].dims)
+    columns = [k for k, dim in enumerate(dims) if dim in block_dims]
+    dims = tuple(dims[k] for k in columns)
+    starts = starts[:, columns]
+    stops = stops[:, columns]
+    if valid is not None:
+        starts = starts[valid]
+        stops = stops[valid]
+    if len(starts) == 0:
+        return None, None
+
+    lower = starts.min(axis=0)
+    upper = stops.max(axis=0)
+    block = _load_values(ds, variables,
+                         {dim: slice(int(lo), int(hi))
+                          for dim, lo, hi in zip(dims, lower, upper)})
+    return block, {dim: int(lo) for dim, lo in zip(dims, lower)}
+
+
+def _window_positions(
+        dims: Tuple[str, ...],
+        positions: Dict[str, np.ndarray],
+        indices: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Looks up the integer [start, stop) positions of windows along the given
+    dimensions.
+
+    :param dims: The dimensions of the variable, in order.
+    :type dims: Tuple[str, ...]
+    :param positions: The positions of the intervals per dimension, as
+        returned by `_dimension_positions`.
+    :type positions: Dict[str, numpy.ndarray]
+    :param indices: The structured indices array returned by
+        `_define_windows` (or a slice of it).
+    :type indices: numpy.ndarray
+    :return: Two (n_windows, n_dims) integer arrays holding the start and
+        stop positions, with the dimensions in the order of `dims`.
+    :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+    """
+    window_positions = [positions[dim][indices[dim]] for dim in dims]
+    starts = np.stack([pos[:, 0] for pos in window_positions], axis=1)
+    stops = np.stack([pos[:, 1] for pos in window_positions], axis=1)
+    return starts, stops
+
+
+def _get_means_jitted(
+        block: Optional[xr.Dataset],
+        offsets: Optional[Dict[str, int]],
+        var: str,
+        dims: Tuple[str, ...],
+        starts: np.ndarray,
+        stops: np.ndarray,
+        workers: Optional[int] = None,
+        valid: Optional[np.ndarray] = None,
+        dtype: Optional[np.dtype] = None
+) -> np.ndarray:
+    """
+    Computes the mean of a variable within every window of a batch, using the
+    compiled `batch_nanmean` kernel on the block loaded by `_load_block`.
+
+    :param block: The in-memory block of the batch, None if no window of the
+        batch needed to be read.
+    :type block: Optional[xarray.Dataset]
+    :param offsets: The start position of the block per dimension.
+    :type offsets: Optional[Dict[str, int]]
+    :param var: The variable to reduce.
+    :type var: str
+    :param dims: The dimensions the columns of `starts` and `stops` refer to.
+    :type dims: Tuple[str, ...]
+    :param starts: The (n_windows, n_dims) start positions of the windows.
+    :type starts: numpy.ndarray
+    :param stops: The (n_windows, n_dims) stop positions of the windows.
+    :type stops: numpy.ndarray
+    :param workers: The number of threads used by the kernel.
+    :type workers: Optional[int]
+    :param valid: Whether each window contains any valid value, as returned
+        by `_valid_windows`. Windows without valid values are skipped.
+    :type valid: Optional[numpy.ndarray]
+    :param dtype: The dtype of the means, defaults to float64.
+    :type dtype: Optional[numpy.dtype]
+    :return: The mean of every window, NaN for windows without valid values.
+    :rtype: numpy.ndarray
+    """
+    means = np.full(len(starts), np.nan, dtype=dtype or np.float64)
+    if block is None:
+        return means
+
+    if valid is None:
+        valid = np.ones(len(starts), dtype=bool)
+    if not valid.any():
+        return means
+
+    columns = [dims.index(dim) for dim in block[var].dims]
+    lower = np.array([offsets[dim] for dim in block[var].dims],
+                     dtype=np.int64)
+    values = np.ascontiguousarray(block[var].values)
+    means[valid] = batch_nanmean(values,
+                                 starts[valid][:, columns] - lower,
+                                 stops[valid][:, columns] - lower,
+                                 workers=workers)
     return means
@@ -3,6 +3,38 @@ import xarray as xr
 from typing import Union
 
 
+def _count_steps(length: float, step: Union[float, int]) -> int:
+    # The number of steps of `step` needed to cover `length`, rounding off
+    # the floating point noise of the division first
+    return int(np.ceil(round(length / step, 9)))
+
+
+def _global_axis(
+        start: Union[float, int],
+        end: Union[float, int],
+        step: Union[float, int]
+) -> np.ndarray:
+    """
+    Builds the coordinates start, start + step, ... below `end`, like
+    `np.arange(start, end, step)`, but from an explicit count so that the
+    length does not depend on accumulated floating point error.
+    """
+    n = _count_steps(end - start, step)
+    return np.linspace(start, start + n * step, n, endpoint=False)
+
+
+def _axis_index(
+        axis: np.ndarray,
+        value: float,
+        step: Union[float, int]
+) -> int:
+    """
+    Returns the position of the first coordinate of a regular `axis` that is
+    not below `value` (as `np.searchsorted`), computed from the step.
+    """
+    return min(max(_count_steps(value - axis[0], step), 0), len(axis))
+
+
 def expand_to_global_coverage(ds, step_lon, step_lat):
     """
     Expands a dataset to global latitude and longitude coverage,
@@ -14,45 +46,48 @@ def expand_to_global_coverage(ds, step_lon, step_lat):
     :param step_lat: Latitude resolution for the global dataset.
     :return: Expanded xarray.Dataset with global coverage.
     """
-    global_lat = np.arange(-90, 90, step_lat)
-    global_lon = np.arange(-180, 180, step_lon)
+    global_lat = _global_axis(-90, 90, step_lat)
+    global_lon = _global_axis(-180, 180, step_lon)
 
     print(f"global latitudes: {global_lat}")
     print(f"global longitudes: {global_lon}")
 
+    # Fill plain NumPy arrays and build the Dataset once at the end, rather
+    # than allocating a DataArray per variable and writing through xarray
+    if 'time' in ds.dims:
+        dims = ["time", "latitude", "longitude"]
+        coords = {"time": ds["time"],
+                  "latitude": global_lat,
+                  "longitude": global_lon}
+        shape = (len(ds["time"]), len(global_lat), len(global_lon))
+    else:
+        dims = ["latitude", "longitude"]
+        coords = {"latitude": global_lat, "longitude": global_lon}
+        shape = (len(global_lat), len(global_lon))
+
+    # Keep float variables in their own precision (float32 data stays
+    # float32); other types become float64 so missing areas can be NaN
+    dtypes = {}
+    for var_name in ds.data_vars:
+        dtype = ds[var_name].dtype
+        if not np.issubdtype(dtype, np.floating):
+            dtype = np.dtype(np.float64)
+        dtypes[var_name] = dtype
+
+    # Allocate and fill the variables of each dtype as one stacked array,
+    # each variable being a view of its layer
     global_data = {}
-    for var_name, da in ds.data_vars.items():
-
-        if 'time' in ds.dims:
-
-            global_data[var_name] = xr.DataArray(
-                np.full(
-                    (
-                        len(ds["time"]),
-                        len(global_lat),
-                        len(global_lon)
-                    ),
-                    np.nan),
-
-                dims=["time", "latitude", "longitude"],
-                coords={"time": ds["time"],
-                        "latitude": global_lat,
-                        "longitude": global_lon},
-            )
-        else:
-            global_data[var_name] = xr.DataArray(
-                np.full((len(global_lat), len(global_lon)), np.nan),
-                dims=["latitude", "longitude"],
-                coords={"latitude": global_lat, "longitude": global_lon},
-            )
-    global_ds = xr.Dataset(global_data)
+    for dtype in set(dtypes.values()):
+        var_names = [name for name in dtypes if dtypes[name] == dtype]
+        stacked = np.full((len(var_names),) + shape, np.nan, dtype=dtype)
+        global_data.update(zip(var_names, stacked))
 
     original_lat = ds['latitude'].values
     original_lon = ds['longitude'].values
 
-    lat_start_idx = np.searchsorted(global_lat, original_lat[-1])
+    lat_start_idx = _axis_index(global_lat, original_lat[-1], step_lat)
     lat_end_idx = lat_start_idx + len(original_lat)
-    lon_start_idx = np.searchsorted(global_lon, original_lon[0])
+    lon_start_idx = _axis_index(global_lon, original_lon[0], step_lon)
     lon_end_idx = lon_start_idx + len(original_lon)
 
     for var_name in ds.data_vars:
@@ -65,16 +100,22 @@ def expand_to_global_coverage(ds, step_lon, step_lat):
                 original_data = ds[var_name].values
                 # print(f"Original data shape (time, lat, lon): "
                 #       f"{original_data.shape}")
-                original_data = np.flip(original_data, axis=1)
-                global_ds[var_name][:, lat_start_idx-1:lat_end_idx-1,
+                # Reversed views, copied once by the assignment below
+                original_data = original_data[:, ::-1]
+                global_data[var_name][:, lat_start_idx-1:lat_end_idx-1,
                 lon_start_idx-1:lon_end_idx-1] = original_data
 
             else:
                 original_data = ds[var_name].values
-                original_data = np.flip(original_data, axis=0)
-                global_ds[var_name][lat_start_idx:lat_end_idx,
+                original_data = original_data[::-1]
+                global_data[var_name][lat_start_idx:lat_end_idx,
                 lon_start_idx:lon_end_idx] = original_data
 
+    global_ds = xr.Dataset(
+        {var_name: (dims, global_data[var_name])
+         for var_name in ds.data_vars},
+        coords=coords)
+
     return global_ds
 
 # outdated version, will keep as backup
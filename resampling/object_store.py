@@ -1,13 +1,98 @@
 import s3fs
+import functools
+import zarr
 import xarray
 import numpy as np
+import dask.array as da
 import xarray as xr
 import datetime as dt
+from numcodecs import Blosc
+from typing import Any
 from typing import List
 from typing import Dict
 from typing import Union
 from typing import Tuple
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from resampling._define_windows import _label_positions
+
+# Chunks of the Zarr stores created here are kept at or below this size,
+# large enough that S3 requests are not dominated by per-object overhead.
+_TARGET_CHUNK_BYTES = 16 * 2 ** 20
+
+# Short coordinate names, and the names they are renamed to when read
+_COORD_NAMES = {"lon": "longitude", "lat": "latitude"}
+
+# Number of chunks written at once by a batch write. Writes to S3 are
+# latency-bound, so this is well above the number of cores.
+_WRITE_CONCURRENCY = 64
+
+# Shared by all batch writes, so that concurrent writes (also from different
+# threads) into the same chunk are serialized per chunk.
+_SYNCHRONIZER = zarr.ThreadSynchronizer()
+
+# Buckets (per filesystem) whose connection test passed in this process
+_CONNECTED_BUCKETS = set()
+
+
+@functools.lru_cache(maxsize=8)
+def _s3_filesystem(
+        endpoint_url: str,
+        aws_access_key_id: str,
+        aws_secret_access_key: str,
+        aws_session_token: str
+) -> s3fs.S3FileSystem:
+    """
+    Returns the S3FileSystem for an endpoint and credentials, shared by all
+    ObjectStore instances using them, so that their connections are reused.
+
+    :param endpoint_url: The URL of the S3-compatible object storage endpoint.
+    :type endpoint_url: str
+    :param aws_access_key_id: The AWS access key for authentication.
+    :type aws_access_key_id: str
+    :param aws_secret_access_key: The AWS secret key for authentication.
+    :type aws_secret_access_key: str
+    :param aws_session_token: AWS session token for temporary credentials.
+    :type aws_session_token: str
+
+    :return: The S3 filesystem.
+    :rtype: s3fs.S3FileSystem
+    """
+    return s3fs.S3FileSystem(
+        key=aws_access_key_id,
+        secret=aws_secret_access_key,
+        token=aws_session_token,
+        client_kwargs={'endpoint_url': endpoint_url},
+        # Enough connections for the concurrent chunk reads and writes
+        config_kwargs={"max_pool_connections": _WRITE_CONCURRENCY},
+        # Zarr reads and writes whole chunk objects, read-ahead caching
+        # of file handles only adds copies
+        default_cache_type="none"
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _s3_map(
+        s3: s3fs.S3FileSystem,
+        root: str,
+        create: bool = False
+) -> s3fs.S3Map:
+    """
+    Returns the key-value mapping of a store on the S3 filesystem, reused
+    across calls for the same store.
+
+    :param s3: The S3 filesystem.
+    :type s3: s3fs.S3FileSystem
+    :param root: The path of the store, including the bucket.
+    :type root: str
+    :param create: Whether to create the path if it does not exist.
+    :type create: bool
+
+    :return: The mapping of the store.
+    :rtype: s3fs.S3Map
+    """
+    return s3fs.S3Map(root=root, s3=s3, create=create)
 
 
 class ObjectStore:
@@ -76,47 +161,48 @@ class ObjectStore:
         This method initializes the S3 connection using the S3FileSystem from
         the `s3fs` library, which allows interaction with the S3 bucket.
         """
-        self._s3 = s3fs.S3FileSystem(
-            key=self._aws_access_key_id,
-            secret=self._aws_secret_access_key,
-            token=self._aws_session_token,
-            client_kwargs={'endpoint_url': self._endpoint_url}
+        self._s3 = _s3_filesystem(
+            endpoint_url=self._endpoint_url,
+            aws_access_key_id=self._aws_access_key_id,
+            aws_secret_access_key=self._aws_secret_access_key,
+            aws_session_token=self._aws_session_token,
         )
 
     def _test_connection(self):
         """
         Test to check S3 connection using s3fs.
-        This method verifies the connection to the S3 bucket by attempting to
-        list the contents of the bucket.
+        This method verifies the connection to the S3 bucket with a single
+        HEAD request on the bucket, rather than listing its contents. A
+        bucket is checked once per process and filesystem.
         """
-        try:
-            bucket_contents = self._s3.ls(self._bucket)
+        key = (self._s3, self._bucket)
+        if key in _CONNECTED_BUCKETS:
+            return
 
-            if not bucket_contents:
-                pass
-                # print(
-                #     f"Bucket {self._bucket} is empty, but the connection is "
-                #     f"successful.")
-            else:
-                pass
-                # print(f"Bucket {self._bucket} contains: {bucket_contents}")
+        try:
+            exists = self._s3.exists(self._bucket)
 
             # print("S3 connection test passed.")
 
-        except FileNotFoundError:
-            raise RuntimeError(
-                f"Bucket {self._bucket} does not exist or is inaccessible.")
-
         except Exception as e:
             raise RuntimeError(
                 f"An unexpected error occurred during S3 connection test: {e}")
 
+        if not exists:
+            raise RuntimeError(
+                f"Bucket {self._bucket} does not exist or is inaccessible.")
+
+        _CONNECTED_BUCKETS.add(key)
+
     def extract_zarr(
             self,
             name: str,
             var: Optional[str] = None,
             lon_range: Optional[Tuple[float, float]] = None,
             lat_range: Optional[Tuple[float, float]] = None,
+            decode_times: bool = True,
+            mask_and_scale: bool = True,
+            decode_cf: bool = True,
     ) -> xarray.Dataset:
         """
         Extracts a Zarr dataset from the specified S3 bucket.
@@ -138,6 +224,18 @@ class ObjectStore:
             If None, no subsetting is performed.
         :type lat_range: Optional[Tuple[float, float]]
 
+        :param decode_times: Whether to decode CF times to datetimes. Passed
+            on to `xarray.open_zarr`.
+        :type decode_times: bool
+
+        :param mask_and_scale: Whether to replace fill values by NaN and
+            apply scale_factor/add_offset. Passed on to `xarray.open_zarr`.
+        :type mask_and_scale: bool
+
+        :param decode_cf: Whether to decode CF conventions at all; False
+            returns the raw stored values. Passed on to `xarray.open_zarr`.
+        :type decode_cf: bool
+
         :return: The extracted and optionally subsetted xarray dataset.
         :rtype: xarray.Dataset
 
@@ -145,21 +243,18 @@ class ObjectStore:
             dataset.
         """
         bucket = f"{self._bucket}/{name}"
-        store = s3fs.S3Map(root=bucket, s3=self._s3, create=False)
-        ds = xarray.open_zarr(store=store, consolidated=True)
-
-        if 'lon' in ds.coords:
-            ds = ds.rename({"lon": "longitude"})
-        if 'lat' in ds.coords:
-            ds = ds.rename({"lat": "latitude"})
-
-        sel_kwargs = {}
-        if lon_range is not None:
-            sel_kwargs['longitude'] = slice(lon_range[0], lon_range[1])
-        if lat_range is not None:
-            sel_kwargs['latitude'] = slice(lat_range[0], lat_range[1])
-        if sel_kwargs:
-            ds = ds.sel(**sel_kwargs)
+        store = _s3_map(self._s3, bucket)
+        # When a single variable is requested, the others are not opened
+        drop_variables = None
+        if var is not None:
+            drop_variables = ObjectStore._other_variables(store, var)
+        ds = xarray.open_zarr(store=store, consolidated=True,
+                              drop_variables=drop_variables,
+                              decode_times=decode_times,
+                              mask_and_scale=mask_and_scale,
+                              decode_cf=decode_cf)
+
+        ds = ObjectStore._subset(ds, lon_range, lat_range)
 
         if var is not None:
             if var in ds.data_vars:
@@ -169,6 +264,104 @@ class ObjectStore:
 
         return ds
 
+    def extract_many_zarr(
+            self,
+            names: List[str],
+            lon_range: Optional[Tuple[float, float]] = None,
+            lat_range: Optional[Tuple[float, float]] = None,
+    ) -> xarray.Dataset:
+        """
+        Extracts several Zarr datasets from the S3 bucket (e.g. one per
+        variable) and merges them into one dataset by their coordinates. The
+        stores are opened concurrently, so opening takes about as long as the
+        slowest store instead of the sum over all stores.
+        Optionally, subsets the dataset on longitude and latitude ranges.
+
+        :param names: The names of the Zarr datasets within the bucket.
+        :type names: List[str]
+
+        :param lon_range: The longitude range to subset the dataset (min, max).
+            If None, no subsetting is performed.
+        :type lon_range: Optional[Tuple[float, float]]
+
+        :param lat_range: The latitude range to subset the dataset (min, max).
+            If None, no subsetting is performed.
+        :type lat_range: Optional[Tuple[float, float]]
+
+        :return: The merged and optionally subsetted xarray dataset.
+        :rtype: xarray.Dataset
+        """
+        stores = [_s3_map(self._s3, f"{self._bucket}/{name}")
+                  for name in names]
+        ds = xarray.open_mfdataset(stores, engine="zarr", parallel=True,
+                                   consolidated=True, combine="by_coords",
+                                   chunks={})
+        return ObjectStore._subset(ds, lon_range, lat_range)
+
+    @staticmethod
+    def _subset(
+            ds: xarray.Dataset,
+            lon_range: Optional[Tuple[float, float]] = None,
+            lat_range: Optional[Tuple[float, float]] = None,
+    ) -> xarray.Dataset:
+        """
+        Renames short lon/lat coordinates to longitude/latitude, and subsets
+        the dataset on longitude and latitude ranges (inclusive).
+
+        :param ds: The dataset to subset.
+        :type ds: xarray.Dataset
+        :param lon_range: The longitude range (min, max), if any.
+        :type lon_range: Optional[Tuple[float, float]]
+        :param lat_range: The latitude range (min, max), if any.
+        :type lat_range: Optional[Tuple[float, float]]
+
+        :return: The renamed and subsetted dataset.
+        :rtype: xarray.Dataset
+        """
+        # Rename the short coordinate names in one go
+        rename_map = {short: name for short, name in _COORD_NAMES.items()
+                      if short in ds.coords}
+        if rename_map:
+            ds = ds.rename(rename_map)
+
+        # Translate the ranges to positions once and slice with isel, which
+        # skips the per-call label lookups of sel
+        isel_kwargs = {}
+        for dim, dim_range in (("longitude", lon_range),
+                               ("latitude", lat_range)):
+            if dim_range is not None:
+                bounds = np.array([dim_range], dtype=float)
+                lo, hi = _label_positions(ds[dim].values, bounds)[0]
+                isel_kwargs[dim] = slice(int(lo), int(hi))
+        if isel_kwargs:
+            ds = ds.isel(**isel_kwargs)
+        return ds
+
+    @staticmethod
+    def _other_variables(store: s3fs.S3Map, var: str) -> Optional[List[str]]:
+        """
+        Lists the arrays of a Zarr store that are not needed for a variable,
+        i.e. neither the variable, nor one of its dimension or other
+        coordinates. Only the consolidated metadata is read.
+
+        :param store: The Zarr store.
+        :type store: s3fs.S3Map
+        :param var: The variable to keep.
+        :type var: str
+
+        :return: The names of the other arrays, or None if the store has no
+            array `var`.
+        :rtype: Optional[List[str]]
+        """
+        group = zarr.open_consolidated(store, mode="r")
+        arrays = dict(group.arrays())
+        if var not in arrays:
+            return None
+        attrs = arrays[var].attrs
+        keep = {var, *attrs.get("_ARRAY_DIMENSIONS", []),
+                *attrs.get("coordinates", "").split()}
+        return [name for name in arrays if name not in keep]
+
     def check_zarr_exists(self, zarr_store_path: str) -> bool:
         """
         Checks if a Zarr store exists in the specified S3 path.
@@ -185,22 +378,27 @@ class ObjectStore:
         full_path = f"{self._bucket}/{zarr_store_path}"
 
         try:
-            if self._s3.exists(full_path) and self._s3.isdir(full_path):
-                return True
-            elif self._s3.exists(full_path):
-                print(f"The path '{full_path}' exists but is not a directory.")
-                return False
-            else:
-                return False
+            # A single request tells both whether and what the path is
+            info = self._s3.info(full_path)
+        except FileNotFoundError:
+            return False
         except Exception as e:
             print(f"Error checking S3 path: {e}")
             return False
 
+        if info["type"] == "directory":
+            return True
+        print(f"The path '{full_path}' exists but is not a directory.")
+        return False
+
     def write_zarr(
             self,
             dataset: xr.DataTree | xr.Dataset,
             name: Optional[str] = None,
             mode: Optional[str] = None,
+            encoding: Optional[Dict[str, Dict[str, Any]]] = None,
+            compute: bool = True,
+            region: Optional[Dict[str, slice]] = None,
     ) -> None:
         """
         Writes a Dataset or DataTree to a Zarr store on S3.
@@ -217,27 +415,50 @@ class ObjectStore:
             Other options include 'a' for append and 'r+' for read and write.
         :type mode: Optional[str]
 
+        :param encoding: Optional per-variable encoding (e.g. compressor,
+            chunks) passed on to `to_zarr`. Only applies when variables are
+            created, not when writing into existing ones.
+        :type encoding: Optional[Dict[str, Dict[str, Any]]]
+
+        :param compute: Whether to write the (dask) data of the variables. If
+            False, only the metadata, coordinates and in-memory variables are
+            written.
+        :type compute: bool
+
+        :param region: Optional slices per dimension of an existing Zarr
+            store to write the dataset into. Only the chunks overlapping the
+            region are written; the store's metadata is left untouched.
+            Defaults the mode to 'r+'.
+        :type region: Optional[Dict[str, slice]]
+
         :return: None
         :rtype: None
         """
         if mode is None:
-            mode = "w"
+            mode = "w" if region is None else "r+"
 
         if not name:
             name = \
                 f"new_zarr_{dt.datetime.now().strftime('%Y-%m-%d %H-%M')}.zarr"
         bucket = self._bucket + "/" + name
 
-        store = s3fs.S3Map(root=bucket, s3=self._s3, create=True)
+        store = _s3_map(self._s3, bucket, create=True)
 
-        dataset.to_zarr(store=store, consolidated=True, mode=mode)
+        if region is not None:
+            # Encoding and consolidated metadata can't change on region writes
+            dataset.to_zarr(store=store, mode=mode, region=region,
+                            compute=compute)
+            return
+
+        dataset.to_zarr(store=store, consolidated=True, mode=mode,
+                        encoding=encoding, compute=compute)
 
     def write_zarr_batch(
             self,
             zarr_store_path: str,
             variable_name: str,
             batch_values: np.ndarray,
-            indexes: list
+            indexes: Union[list, np.ndarray]
     ) -> None:
         """
         Writes a batch of values to a specific variable in a Zarr store on S3.
@@ -254,9 +475,10 @@ class ObjectStore:
             store.
         :type batch_values: np.ndarray
 
-        :param indexes: A list of dictionaries representing the indices for
-            each dimension of the variable.
-        :type indexes: list
+        :param indexes: The indices for each dimension of the variable, one
+            entry per value. Either a list of dictionaries or a structured
+            array with one field per dimension.
+        :type indexes: Union[list, np.ndarray]
 
         :return: None
         :rtype: None
@@ -266,33 +488,303 @@ class ObjectStore:
         :raises ValueError: If the batch of values is empty or contains NaN
             values.
         """
-        if np.isnan(batch_values).all():
+        self.write_zarr_batch_multi(zarr_store_path=zarr_store_path,
+                                    batch_values={variable_name: batch_values},
+                                    indexes=indexes)
+
+    def write_zarr_batch_multi(
+            self,
+            zarr_store_path: str,
+            batch_values: Dict[str, np.ndarray],
+            indexes: Union[list, np.ndarray],
+            workers: Optional[int] = None
+    ) -> None:
+        """
+        Writes a batch of values of several variables, which share the same
+        indices, to a Zarr store on S3. The store is opened once for all
+        variables. The values are written straight into the Zarr arrays, one
+        task per chunk they fall in, leaving out NaN values (the store is
+        created filled with NaN) and quantizing values for variables stored
+        as integers; chunks are locked by a thread
+        synchronizer, so batches may also be written from several threads.
+
+        :param zarr_store_path: The path to the Zarr store within the S3
+            bucket.
+        :type zarr_store_path: str
+
+        :param batch_values: The values to write per variable name.
+        :type batch_values: Dict[str, np.ndarray]
+
+        :param indexes: The indices for each dimension of the variables, one
+            entry per value. Either a list of dictionaries or a structured
+            array with one field per dimension.
+        :type indexes: Union[list, np.ndarray]
+
+        :param workers: The number of threads writing chunks, defaults to
+            `_WRITE_CONCURRENCY`.
+        :type workers: Optional[int]
+
+        :return: None
+        :rtype: None
+
+        :raises IndexError: If the provided indices are out of bounds for a
+            variable.
+        """
+        # The destination is created filled with NaN, so NaN means need not
+        # be written (and their chunks not touched). Only float values can be
+        # NaN; the mask is computed once and reused below
+        valid = {}
+        for name, values in batch_values.items():
+            values = np.asarray(values)
+            keep = (~np.isnan(values)
+                    if np.issubdtype(values.dtype, np.floating) else None)
+            if keep is None or keep.any():
+                valid[name] = (values, keep)
+        if not valid:
             return
 
-        ds = self.extract_zarr(name=zarr_store_path)
-        variable = ds[variable_name]
-        dim_names = variable.dims
+        store = _s3_map(self._s3, f"{self._bucket}/{zarr_store_path}")
+        group = zarr.open_group(store=store, mode="r+",
+                                synchronizer=_SYNCHRONIZER)
+
+        if workers is None:
+            workers = _WRITE_CONCURRENCY
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for variable_name, (values, keep) in valid.items():
+                array = group[variable_name]
+                dim_names = [_COORD_NAMES.get(dim, dim)
+                             for dim in array.attrs["_ARRAY_DIMENSIONS"]]
+                points = ObjectStore._index_arrays(indexes, dim_names)
+
+                out_of_bounds = np.zeros(len(values), dtype=bool)
+                for point, size in zip(points, array.shape):
+                    out_of_bounds |= (point < 0) | (point >= size)
+                if out_of_bounds.any():
+                    index = indexes[int(np.argmax(out_of_bounds))]
+                    raise IndexError(f"Index out of bounds: {index}")
+
+                if keep is not None:
+                    points = tuple(point[keep] for point in points)
+                    values = values[keep]
+
+                values = ObjectStore._encode_values(array, values)
+
+                for members in ObjectStore._chunk_groups(points, array.chunks):
+                    futures.append(executor.submit(
+                        ObjectStore._write_points,
+                        array,
+                        tuple(point[members] for point in points),
+                        values[members]))
+
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _encode_values(array: zarr.Array, values: np.ndarray) -> np.ndarray:
+        """
+        Encodes (non-NaN) values for an array stored quantized, i.e. with a
+        `scale_factor` and/or `add_offset` attribute, as written by xarray.
+        Values for other arrays are returned as is.
+
+        :param array: The Zarr array the values are written to.
+        :type array: zarr.Array
+        :param values: The values to encode.
+        :type values: np.ndarray
+
+        :return: The values in the dtype of the array.
+        :rtype: np.ndarray
+        """
+        if "scale_factor" not in array.attrs and \
+                "add_offset" not in array.attrs:
+            return values
+        scale_factor = array.attrs.get("scale_factor", 1.0)
+        add_offset = array.attrs.get("add_offset", 0.0)
+        encoded = np.round((values - add_offset) / scale_factor)
+        if np.issubdtype(array.dtype, np.integer):
+            limits = np.iinfo(array.dtype)
+            # The lowest integer is kept free as the fill value
+            encoded = np.clip(encoded, limits.min + 1, limits.max)
+        return encoded.astype(array.dtype)
+
+    @staticmethod
+    def _write_points(
+            array: zarr.Array,
+            points: Tuple[np.ndarray, ...],
+            values: np.ndarray
+    ) -> None:
+        """
+        Writes values at the given points of a Zarr array. Points that
+        exactly fill their bounding box are written as one region (so whole
+        chunks are written without being read first), others point by point.
+
+        :param array: The Zarr array to write into.
+        :type array: zarr.Array
+        :param points: One integer index array per dimension.
+        :type points: Tuple[np.ndarray, ...]
+        :param values: The value of every point.
+        :type values: np.ndarray
 
-        for value, index in zip(batch_values, indexes):
-            indices = [index.get(dim) for dim in dim_names]
+        :return: None
+        :rtype: None
+        """
+        lower = tuple(int(point.min()) for point in points)
+        shape = tuple(int(point.max()) - start + 1
+                      for point, start in zip(points, lower))
+        local = tuple(point - start for point, start in zip(points, lower))
+
+        if len(values) == np.prod(shape) and len(np.unique(
+                np.ravel_multi_index(local, shape))) == len(values):
+            region = np.empty(shape, dtype=array.dtype)
+            region[local] = values
+            array[tuple(slice(start, start + size)
+                        for start, size in zip(lower, shape))] = region
+        else:
+            array.vindex[points] = values
+
+    @staticmethod
+    def _index_arrays(
+            indexes: Union[list, np.ndarray],
+            dim_names: List[str]
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        Converts per-value indices to one integer index array per dimension.
+
+        :param indexes: The indices, either a list of dictionaries or a
+            structured array with one field per dimension.
+        :type indexes: Union[list, np.ndarray]
+        :param dim_names: The dimensions to return the index arrays of.
+        :type dim_names: List[str]
+
+        :return: The index arrays, in the order of `dim_names`.
+        :rtype: Tuple[np.ndarray, ...]
+        """
+        if isinstance(indexes, np.ndarray) and indexes.dtype.names:
+            return tuple(indexes[dim].astype(np.int64) for dim in dim_names)
+        return tuple(np.fromiter((index[dim] for index in indexes),
+                                 dtype=np.int64, count=len(indexes))
+                     for dim in dim_names)
+
+    @staticmethod
+    def _chunk_groups(
+            points: Tuple[np.ndarray, ...],
+            chunks: Tuple[int, ...]
+    ) -> List[np.ndarray]:
+        """
+        Groups points by the chunk they fall in.
+
+        :param points: One integer index array per dimension.
+        :type points: Tuple[np.ndarray, ...]
+        :param chunks: The chunk shape of the array.
+        :type chunks: Tuple[int, ...]
+
+        :return: The positions (into the index arrays) of the points of every
+            chunk.
+        :rtype: List[np.ndarray]
+        """
+        chunk_ids = np.ravel_multi_index(
+            tuple(point // chunk for point, chunk in zip(points, chunks)),
+            tuple(int(point.max()) // chunk + 1
+                  for point, chunk in zip(points, chunks)))
+        order = np.argsort(chunk_ids, kind="stable")
+        splits = np.flatnonzero(np.diff(chunk_ids[order])) + 1
+        return np.split(order, splits)
 
-            if all(0 <= indices[i] < variable.shape[i] for i in
-                   range(len(dim_names))):
-                variable[tuple(indices)] = value
+    @staticmethod
+    def _default_encoding(ds: xr.Dataset) -> Dict[str, Dict[str, Any]]:
+        """
+        Builds the default Zarr encoding for the variables of a Dataset.
+
+        Every variable is compressed with blosc/lz4 at a low level. Floating
+        point variables are bit-shuffled, other dtypes are byte-shuffled,
+        which lets the (multi-threaded) blosc codec compress well while
+        encoding and decoding much faster than zlib or zstd; the destination
+        chunks are read and rewritten for every batch, so codec speed matters
+        more than the last bit of compression. Variables are chunked in
+        blocks of up to 16 MB, see `_chunk_shape`, unless their encoding
+        sets the chunks. Encoding already set on a variable (e.g.
+        quantization, see `_create_empty_ds`) is kept, and the stored dtype
+        decides the shuffle and chunk size. Quantized variables are
+        compressed with blosc/zstd (level 5) and bit-shuffled instead: their
+        integers hold few significant bits, which zstd compresses several
+        times better, and they are half the size to (de)compress already.
+        Coordinates are stored as one chunk each, so they are fetched with a
+        single request.
+
+        :param ds: The Dataset to build the encoding for.
+        :type ds: xarray.Dataset
+
+        :return: A mapping from variable name to its encoding.
+        :rtype: Dict[str, Dict[str, Any]]
+        """
+        encoding = {}
+        for name, variable in ds.data_vars.items():
+            # Variables may be stored in another (quantized) dtype
+            dtype = np.dtype(variable.encoding.get("dtype", variable.dtype))
+            if "scale_factor" in variable.encoding:
+                compressor = Blosc(cname="zstd", clevel=5,
+                                   shuffle=Blosc.BITSHUFFLE)
+            elif np.issubdtype(dtype, np.floating):
+                compressor = Blosc(cname="lz4", clevel=1,
+                                   shuffle=Blosc.BITSHUFFLE)
             else:
-                raise IndexError(f"Index out of bounds: {index}")
+                compressor = Blosc(cname="lz4", clevel=1,
+                                   shuffle=Blosc.SHUFFLE)
+            encoding[name] = {
+                "chunks": ObjectStore._chunk_shape(variable.shape,
+                                                   dtype.itemsize),
+                **variable.encoding,
+                "compressor": compressor,
+            }
+        # Coordinates are read whole, so they are stored as a single chunk
+        for name, coord in ds.coords.items():
+            if coord.ndim > 0:
+                encoding[name] = {**coord.encoding, "chunks": coord.shape}
+        return encoding
 
-        self.write_zarr(dataset=ds, name=zarr_store_path, mode="r+")
+    @staticmethod
+    def _chunk_shape(
+            shape: Tuple[int, ...],
+            itemsize: int,
+            target_bytes: int = _TARGET_CHUNK_BYTES
+    ) -> Tuple[int, ...]:
+        """
+        Chooses a chunk shape of at most `target_bytes` (uncompressed) for an
+        array, by halving its largest dimension until the chunk fits. Large
+        chunks keep the number of objects, and thus S3 requests, per write
+        low.
+
+        :param shape: The shape of the array.
+        :type shape: Tuple[int, ...]
+
+        :param itemsize: The size of one element in bytes.
+        :type itemsize: int
+
+        :param target_bytes: The maximum size of a chunk in bytes.
+        :type target_bytes: int
+
+        :return: The chunk shape.
+        :rtype: Tuple[int, ...]
+        """
+        chunks = [max(1, size) for size in shape]
+        while np.prod(chunks) * itemsize > target_bytes and max(chunks) > 1:
+            largest = int(np.argmax(chunks))
+            chunks[largest] = -(-chunks[largest] // 2)
+        return tuple(chunks)
 
     @staticmethod
     def _create_empty_ds(
             coordinate_ranges: Dict[
                 str, List[Union[int, List[int], np.datetime64]]],
-            variables: List[str]
+            variables: List[str],
+            dtypes: Optional[Dict[str, np.dtype]] = None,
+            dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]] = None,
+            chunk_bytes: int = _TARGET_CHUNK_BYTES
     ) -> xr.Dataset:
         """
         Creates an empty xarray Dataset with specified coordinate ranges and
-        variables.
+        variables. The variables are lazy, all-NaN dask arrays.
 
         :param coordinate_ranges: A dictionary where keys are dimension names
             and values are lists of coordinate ranges.
@@ -302,6 +794,21 @@ class ObjectStore:
         :param variables: A list of variable names to include in the Dataset.
         :type variables: List[str]
 
+        :param dtypes: The (floating point) dtype per variable, defaults to
+            float64 for variables that are not listed.
+        :type dtypes: Optional[Dict[str, np.dtype]]
+
+        :param dtype_spec: Variables to store quantized, as (integer dtype,
+            scale_factor, add_offset). Their encoding is set so they are
+            written as that integer dtype, with the lowest integer as fill
+            value (NaN), and read back as floats.
+        :type dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]]
+
+        :param chunk_bytes: The maximum (uncompressed) size of the chunks of
+            the variables, see `_chunk_shape`. The chunks are also set in the
+            encoding of the variables.
+        :type chunk_bytes: int
+
         :return: An empty xarray Dataset with the specified coordinates and
             variables.
         :rtype: xarray.Dataset
@@ -313,26 +820,59 @@ class ObjectStore:
             if dim == "time":
                 coords[dim] = np.array(ranges, dtype='datetime64[ns]')
             elif isinstance(ranges[0], list):
-                coords[dim] = [(interval[0] + interval[1]) / 2 for interval in
-                               ranges if len(interval) == 2]
-                coords[dim].extend(
+                # Midpoints of the [start, end] intervals, followed by the
+                # single labels
+                pairs = [interval for interval in ranges if len(interval) == 2]
+                singles = np.array(
                     [interval[0] for interval in ranges if len(interval) == 1])
+                if pairs:
+                    midpoints = np.asarray(pairs, dtype=np.float64).mean(axis=1)
+                    coords[dim] = np.concatenate([midpoints, singles])
+                else:
+                    coords[dim] = singles
             else:
                 coords[dim] = np.arange(ranges[0], ranges[1])
 
             dimensions.append(dim)
 
         shape = tuple(len(coords[dim]) for dim in dimensions)
-        data_vars = {var: (dimensions, np.full(shape, np.nan)) for var in
-                     variables}
-
-        return xr.Dataset(data_vars, coords=coords)
+        if dtypes is None:
+            dtypes = {}
+        if dtype_spec is None:
+            dtype_spec = {}
+        # Lazy (dask) NaN arrays, chunked like the Zarr store they are
+        # written to, so the empty cube is never held in memory at once
+        data_vars = {}
+        for var in variables:
+            dtype = np.dtype(dtypes.get(var, np.float64))
+            stored = np.dtype(dtype_spec[var][0]) if var in dtype_spec \
+                else dtype
+            chunks = ObjectStore._chunk_shape(shape, stored.itemsize,
+                                              chunk_bytes)
+            data_vars[var] = (dimensions, da.full(shape, np.nan, dtype=dtype,
+                                                  chunks=chunks))
+
+        ds = xr.Dataset(data_vars, coords=coords)
+        for var in variables:
+            ds[var].encoding["chunks"] = ds[var].data.chunksize
+        for var, (stored, scale_factor, add_offset) in dtype_spec.items():
+            if var in ds:
+                ds[var].encoding.update({
+                    "dtype": np.dtype(stored),
+                    "scale_factor": scale_factor,
+                    "add_offset": add_offset,
+                    "_FillValue": np.iinfo(stored).min,
+                })
+        return ds
 
     def create_empty_zarr(
             self,
             zarr_name: str,
             coordinate_ranges: Dict[str, List[Union[int, List[int]]]],
-            variables: List[str]
+            variables: List[str],
+            dtypes: Optional[Dict[str, np.dtype]] = None,
+            dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]] = None,
+            chunk_bytes: int = _TARGET_CHUNK_BYTES
     ) -> xr.Dataset:
         """
         Creates an empty Zarr store with the specified coordinate ranges and
@@ -348,12 +888,31 @@ class ObjectStore:
         :param variables: A list of variable names to include in the Dataset.
         :type variables: List[str]
 
+        :param dtypes: The (floating point) dtype per variable, defaults to
+            float64 for variables that are not listed.
+        :type dtypes: Optional[Dict[str, np.dtype]]
+
+        :param dtype_spec: Variables to store quantized, as (integer dtype,
+            scale_factor, add_offset), see `_create_empty_ds`.
+        :type dtype_spec: Optional[Dict[str, Tuple[np.dtype, float, float]]]
+
+        :param chunk_bytes: The maximum (uncompressed) size of the chunks of
+            the variables. The 16 MB default suits S3; use a smaller size
+            (e.g. 1 MB) for stores on local disks.
+        :type chunk_bytes: int
+
         :return: The created xarray Dataset.
         :rtype: xarray.Dataset
         """
         ds = self._create_empty_ds(coordinate_ranges=coordinate_ranges,
-                                   variables=variables)
-        self.write_zarr(ds, zarr_name)
+                                   variables=variables,
+                                   dtypes=dtypes,
+                                   dtype_spec=dtype_spec,
+                                   chunk_bytes=chunk_bytes)
+        # Only the metadata and coordinates are written: chunks that are never
+        # written read as the NaN fill value
+        self.write_zarr(ds, zarr_name, encoding=self._default_encoding(ds),
+                        compute=False)
         return ds
 
     def delete_zarr(self, zarr_store_path: str) -> None:
@@ -371,15 +930,13 @@ class ObjectStore:
         :raises Exception: If an error occurs while attempting to delete the
             Zarr store.
         """
-        if not self._s3.exists(zarr_store_path):
+        # Delete optimistically rather than checking existence and type first
+        full_path = f"{self._bucket}/{zarr_store_path}"
+        try:
+            self._s3.rm(full_path, recursive=True)
+        except FileNotFoundError:
             raise FileNotFoundError(
                 f"The Zarr store '{zarr_store_path}' does not exist.")
-
-        try:
-            if self._s3.isdir(zarr_store_path):
-                self._s3.rm(zarr_store_path, recursive=True)
-            else:
-                self._s3.rm(zarr_store_path)
         except Exception as e:
             print(f"Error deleting S3 path: {e}")
             raise
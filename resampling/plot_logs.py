@@ -1,93 +1,150 @@
+import os
 import re
+import mmap
+import inspect
+import functools
+import numpy as np
 import pandas as pd
+from typing import Callable
 from typing import Optional
-from datetime import datetime
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
+# Format of the timestamps written by the loggers
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+
+# Regex patterns to match log lines, compiled once at import. The resource
+# pattern scans the raw bytes of a whole file, '^' anchoring it to lines
+_PAT_THREAD_MEMORY = re.compile(
+    rb'^(?P<timestamp>[\d-]+\s[\d:,]+) - Active threads: (?P<threads>\d+), '
+    rb'Memory usage: (?P<memory>[0-9.]+) GB', re.MULTILINE)
+# Types the groups of the resource pattern are parsed into
+_THREAD_MEMORY_DTYPE = np.dtype([('timestamp', 'S32'),
+                                 ('threads', np.int64),
+                                 ('memory', np.float64)])
+# Event lines are either a dataset update or a variable being processed,
+# matched by one pattern and told apart by which group is set
+_PAT_EVENT = re.compile(
+    r'(?P<timestamp>[\d-]+\s[\d:,]+) - '
+    r'(?:Downscaling dataset: (?P<dataset>[\w_]+)'
+    r'|>> Working on VAR (?P<var>[\w_]+) '
+    r'- batch \d+/\d+:windows \[\d+-\d+\]/\d+)'
+)
+
+
+def _cached_by_file(parse: Callable) -> Callable:
+    """
+    Memoizes a log parser on the path, modification time and size of its
+    `logfile`, so that an unchanged log is only parsed once (e.g. when it is
+    plotted repeatedly); a changed log is parsed again. Callers get a copy of
+    the cached DataFrame, so modifying it does not affect later calls.
+    """
+    signature = inspect.signature(parse)
+
+    @functools.lru_cache(maxsize=8)
+    def cached(logfile: str, mtime: int, size: int) -> pd.DataFrame:
+        return parse(logfile)
+
+    @functools.wraps(parse)
+    def wrapper(*args, **kwargs) -> pd.DataFrame:
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        logfile = os.path.abspath(arguments.arguments['logfile'])
+        stat = os.stat(logfile)
+        return cached(logfile, stat.st_mtime_ns, stat.st_size).copy()
+
+    return wrapper
+
+
+def _extract_matches(
+        logfile: str,
+        pattern: re.Pattern,
+        dtype: np.dtype
+) -> np.ndarray:
+    """
+    Extracts the groups of the bytes `pattern` from a log file into a
+    structured array with one field (of `dtype`) per group and one record
+    per match. The file is memory-mapped and scanned in a single regex pass,
+    without reading it into memory or splitting it into lines, and the
+    matches are converted straight into the typed array rather than into
+    Python lists of strings.
+    """
+    # An empty file can't be memory-mapped (and has no matches)
+    if os.path.getsize(logfile) == 0:
+        return np.empty(0, dtype=dtype)
 
+    with open(logfile, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return np.fromiter((match.groups() for match in pattern.finditer(mm)),
+                           dtype=dtype)
+
+
+@_cached_by_file
 def _parse_resource_log(logfile: Optional[str] = 'log_resources.log'
                         ) -> pd.DataFrame:
-    timestamps = []
-    active_threads = []
-    memory_usage = []
-
-    # Define regex patterns to match log lines
-    pattern_thread_memory = re.compile(
-        r'(?P<timestamp>[\d-]+\s[\d:,]+) - Active threads: (?P<threads>\d+), '
-        r'Memory usage: (?P<memory>[0-9.]+) GB')
+    """
+    Parses the resource log into a DataFrame with the columns 'timestamp'
+    (datetime64), 'active_threads' and 'memory_usage', sorted by time.
+    """
+    # Scan the memory-mapped log file for matching lines
+    data = _extract_matches(logfile, _PAT_THREAD_MEMORY, _THREAD_MEMORY_DTYPE)
 
-    # Read and parse the log file
-    with open(logfile, 'r') as f:
-        for line in f:
-            match_thread_memory = pattern_thread_memory.match(line)
-            if match_thread_memory:
-                data = match_thread_memory.groupdict()
-                timestamps.append(datetime.strptime(
-                    data['timestamp'],
-                    '%Y-%m-%d %H:%M:%S,%f'))
-                active_threads.append(int(data['threads']))
-                memory_usage.append(float(data['memory']))
-
-    # Convert lists to pandas DataFrame for easier plotting
+    # Convert the matched columns to a pandas DataFrame for easier plotting
     df = pd.DataFrame({
-        'timestamp': timestamps,
-        'active_threads': active_threads,
-        'memory_usage': memory_usage,
+        'timestamp': pd.to_datetime(data['timestamp'].astype(str),
+                                    format=_TIMESTAMP_FORMAT, cache=True),
+        'active_threads': data['threads'],
+        'memory_usage': data['memory'],
     }).sort_values(by='timestamp').reset_index(drop=True)
 
     return df
 
 
+@_cached_by_file
 def _parse_event_log(logfile: Optional[str] = 'log_events.log'
                      ) -> pd.DataFrame:
-
+    """
+    Parses the event log into a DataFrame with the columns 'timestamp'
+    (datetime64), 'dataset' and 'var', sorted by time. Each variable is
+    listed once, at the first time it is worked on.
+    """
     timestamps = []
     datasets = []
     vars = []
     seen_vars = set()  # To keep track of already seen variables
 
-    # Define regex patterns to match log lines
-    pattern_downscaling = re.compile(
-        r'(?P<timestamp>[\d-]+\s[\d:,]+) - Downscaling dataset: '
-        r'(?P<dataset>[\w_]+)'
-    )
-    pattern_var = re.compile(
-        r'(?P<timestamp>[\d-]+\s[\d:,]+) - >> Working on VAR (?P<var>[\w_]+) '
-        r'- batch \d+/\d+:windows \[\d+-\d+\]/\d+'
-    )
-
     # Read and parse the log file
     with open(logfile, 'r') as f:
         for line in f:
+            # Skip other lines with a cheap substring search before the regex
+            if 'Working on VAR' not in line \
+                    and 'Downscaling dataset:' not in line:
+                continue
+
+            match_event = _PAT_EVENT.match(line)
+            if not match_event:
+                continue
+            data = match_event.groupdict()
+
             # Check for downscaling dataset updates
-            match_downscaling = pattern_downscaling.match(line)
-            if match_downscaling:
-                data = match_downscaling.groupdict()
-                timestamps.append(datetime.strptime(
-                    data['timestamp'],
-                    '%Y-%m-%d %H:%M:%S,%f')
-                )
+            if data['dataset'] is not None:
+                timestamps.append(data['timestamp'])
                 datasets.append(data['dataset'])
                 vars.append(None)  # No variable for this line
 
             # Check for VAR processing lines
-            match_var = pattern_var.match(line)
-            if match_var:
-                data = match_var.groupdict()
+            else:
                 var_name = data['var']
                 if var_name not in seen_vars:
-                    timestamps.append(datetime.strptime(
-                        data['timestamp'],
-                        '%Y-%m-%d %H:%M:%S,%f')
-                    )
+                    timestamps.append(data['timestamp'])
                     datasets.append(None)  # No dataset for this line
                     vars.append(var_name)
                     seen_vars.add(var_name)  # Mark this variable as seen
 
-    # Convert lists to pandas DataFrame
+    # Convert lists to pandas DataFrame, parsing all timestamps at once
     df = pd.DataFrame({
-        'timestamp': timestamps,
+        'timestamp': pd.to_datetime(timestamps, format=_TIMESTAMP_FORMAT,
+                                    cache=True),
         'dataset': datasets,
         'var': vars
     }).sort_values(by='timestamp').reset_index(drop=True)
@@ -95,6 +152,44 @@ def _parse_event_log(logfile: Optional[str] = 'log_events.log'
     return df
 
 
+def _m4_downsample(
+        df: pd.DataFrame,
+        column: str,
+        n_bins: int
+) -> pd.DataFrame:
+    """
+    Reduces a time-sorted DataFrame to the rows needed to draw `column` as
+    a line `n_bins` pixels wide (M4 aggregation): per time bin, the first,
+    last, minimum and maximum rows. The drawn line looks the same, but has
+    at most 4 points per pixel instead of every sample.
+
+    :param df: The data, sorted by its 'timestamp' column.
+    :type df: pandas.DataFrame
+    :param column: The column to be plotted against the timestamps.
+    :type column: str
+    :param n_bins: The number of time bins, e.g. the plot width in pixels.
+    :type n_bins: int
+    :return: The selected rows of `df`, in time order.
+    :rtype: pandas.DataFrame
+    """
+    if len(df) <= 4 * n_bins:
+        return df
+
+    times = df['timestamp'].to_numpy().astype(np.int64)
+    span = max(times[-1] - times[0], 1)
+    bins = np.minimum((times - times[0]) / span * n_bins,
+                      n_bins - 1).astype(np.int64)
+
+    groups = pd.Series(df[column].to_numpy()).groupby(bins)
+    rows = np.unique(np.concatenate([
+        groups.idxmin().to_numpy(),
+        groups.idxmax().to_numpy(),
+        groups.head(1).index.to_numpy(),
+        groups.tail(1).index.to_numpy(),
+    ]))
+    return df.iloc[rows]
+
+
 def _plot_resource_log(
         logfile: Optional[str] = 'log_resources.log'
 ) -> None:
@@ -118,18 +213,19 @@ def _plot_resource_log(
     """
     df = _parse_resource_log(logfile)
 
-    # Ensure 'timestamp' column is in datetime format
-    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-
     # Plot the data
     fig, ax1 = plt.subplots(figsize=(12, 6))
 
+    # Only plot the samples that are visible at the figure's resolution
+    width = int(fig.get_figwidth() * fig.dpi)
+    df_memory = _m4_downsample(df, 'memory_usage', width)
+    df_threads = _m4_downsample(df, 'active_threads', width)
+
     # Plot memory usage on the primary y-axis
     ax1.set_xlabel('Timestamp')
     ax1.set_ylabel('Memory Usage (GB)', color='tab:blue')
-    ax1.plot(df['timestamp'],
-             df['memory_usage'],
+    ax1.plot(df_memory['timestamp'],
+             df_memory['memory_usage'],
              color='tab:blue',
              label='Memory Usage')
     ax1.tick_params(axis='y', labelcolor='tab:blue')
@@ -142,8 +238,8 @@ def _plot_resource_log(
     # Create a second y-axis for active threads
     ax2 = ax1.twinx()
     ax2.set_ylabel('Active Threads', color='tab:red')
-    ax2.plot(df['timestamp'],
-             df['active_threads'],
+    ax2.plot(df_threads['timestamp'],
+             df_threads['active_threads'],
              color='tab:red',
              linestyle='--',
              label='Active Threads')
@@ -191,11 +287,13 @@ def _plot_event_log(
     # Set up the plot
     fig, ax1 = plt.subplots(figsize=(12, 6))
 
-    # Plot vertical lines for each VAR
-    for _, row in var_df.iterrows():
-        timestamp = row['timestamp']
-        var_name = row['var']
-        ax1.axvline(x=timestamp, color='black', linestyle='--')
+    # Plot vertical lines for each VAR, as one collection spanning the axes
+    timestamps = var_df['timestamp'].to_numpy()
+    ax1.vlines(timestamps, 0, 1, transform=ax1.get_xaxis_transform(),
+               colors='black', linestyles='--')
+    # Keep the default y range of an empty axes, the labels are placed in it
+    ax1.set_ylim(0, 1)
+    for timestamp, var_name in zip(timestamps, var_df['var'].to_numpy()):
         ax1.text(timestamp, 0.5, var_name, rotation=90,
                  verticalalignment='center',
                  horizontalalignment='left', color='black', fontsize=8)
@@ -259,27 +357,25 @@ def plot_logs(
     df_resources = _parse_resource_log(resource_log)
     df_events = _parse_event_log(event_log)
 
-    # Ensure 'timestamp' column is in datetime format
-    if not pd.api.types.is_datetime64_any_dtype(df_resources['timestamp']):
-        df_resources['timestamp'] = pd.to_datetime(df_resources['timestamp'])
-
-    if not pd.api.types.is_datetime64_any_dtype(df_events['timestamp']):
-        df_events['timestamp'] = pd.to_datetime(df_events['timestamp'])
-
     # Create a single plot_logs
     fig, ax1 = plt.subplots(figsize=(12, 6))
 
+    # Only plot the samples that are visible at the figure's resolution
+    width = int(fig.get_figwidth() * fig.dpi)
+    df_memory = _m4_downsample(df_resources, 'memory_usage', width)
+    df_threads = _m4_downsample(df_resources, 'active_threads', width)
+
     # Plot Memory Usage on primary y-axis
     ax1.set_xlabel('Timestamp')
     ax1.set_ylabel('Memory Usage (GB)', color='tab:blue')
-    ax1.plot(df_resources['timestamp'], df_resources['memory_usage'],
+    ax1.plot(df_memory['timestamp'], df_memory['memory_usage'],
                   color='tab:blue', label='Memory Usage')
     ax1.tick_params(axis='y', labelcolor='tab:blue')
 
     # Create a second y-axis for active threads
     ax1_twin = ax1.twinx()
     ax1_twin.set_ylabel('Active Threads', color='tab:red')
-    ax1_twin.plot(df_resources['timestamp'], df_resources['active_threads'],
+    ax1_twin.plot(df_threads['timestamp'], df_threads['active_threads'],
                        color='tab:red', linestyle='--', label='Active Threads')
     ax1_twin.tick_params(axis='y', labelcolor='tab:red')
 
@@ -292,12 +388,14 @@ def plot_logs(
         # Filter the DataFrame to only include rows with VAR values
         var_df = df_events[df_events['var'].notna()]
 
-        # Plot vertical lines for each VAR on the primary axes
-        for _, row in var_df.iterrows():
-            timestamp = row['timestamp']
-            var_name = row['var']
-            ax1.axvline(x=timestamp, color='black', linestyle='--')
-            ax1.text(timestamp, ax1.get_ylim()[1], var_name, rotation=90,
+        # Plot vertical lines for each VAR on the primary axes, as one
+        # collection spanning the axes
+        timestamps = var_df['timestamp'].to_numpy()
+        ax1.vlines(timestamps, 0, 1, transform=ax1.get_xaxis_transform(),
+                   colors='black', linestyles='--')
+        y_top = ax1.get_ylim()[1]
+        for timestamp, var_name in zip(timestamps, var_df['var'].to_numpy()):
+            ax1.text(timestamp, y_top, var_name, rotation=90,
                      verticalalignment='top', horizontalalignment='left',
                      color='black', fontsize=8)
 
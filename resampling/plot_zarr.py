@@ -93,12 +93,23 @@ def plot_dataset(
     if var not in ds:
         raise KeyError(f"Variable '{var}' not found in the Dataset.")
 
-    # Extract values and coordinates
-    values = ds[var].values
-
-    # Plot using imshow
     fig, ax = plt.subplots()
-    cax = ax.imshow(values, cmap='viridis')
+
+    # Extract values, averaged over blocks of cells so that at most about
+    # two cells per figure pixel are loaded and rendered
+    data = ds[var]
+    if data.ndim >= 2:
+        width, height = fig.get_size_inches() * fig.dpi
+        factors = {
+            data.dims[-2]: max(1, data.shape[-2] // int(2 * height)),
+            data.dims[-1]: max(1, data.shape[-1] // int(2 * width)),
+        }
+        if any(factor > 1 for factor in factors.values()):
+            data = data.coarsen(factors, boundary='pad').mean()
+    values = data.values
+
+    # Plot using imshow, one image pixel per cell
+    cax = ax.imshow(values, cmap='viridis', interpolation='none')
 
     # Add colorbar
     cbar = plt.colorbar(cax, ax=ax, orientation='vertical')
@@ -0,0 +1,30 @@
+import pytest
+
+# Fully commented-out old tests, kept for reference only
+collect_ignore = ["test_down_scale.py"]
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-network",
+        action="store_true",
+        default=False,
+        help="Run the tests that need network access (marked 'network').")
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "network: test needs network access, skipped unless --run-network "
+        "is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    """ Skip the tests that need network access, unless --run-network """
+    if config.getoption("--run-network"):
+        return
+
+    skip_network = pytest.mark.skip(reason="needs --run-network to run")
+    for item in items:
+        if "network" in item.keywords:
+            item.add_marker(skip_network)
@@ -0,0 +1,54 @@
+import unittest
+
+from resampling.down_scale import _centre_coordinates
+from resampling._define_windows import _handle_numeric_dimension
+
+
+class TestNumericIntervals(unittest.TestCase):
+
+    def test_no_interval_past_stop(self):
+        """ Test that float rounding does not add an interval at the stop """
+        for start, stop, step in [(1.0, 1.3, 0.1), (0, 1, 0.1),
+                                  (30, 40, 0.37), (-10, 40, 0.5)]:
+            with self.subTest(range=(start, stop), step=step):
+                intervals, indices = _handle_numeric_dimension(
+                    start, stop, step, invert=False)
+                centres = _centre_coordinates(step, start, stop, False)
+
+                self.assertEqual(len(intervals), len(centres))
+                self.assertEqual(indices, list(range(len(intervals))))
+                self.assertTrue(all(lower < stop for lower, _ in intervals))
+                self.assertEqual(intervals[0][0], start)
+                self.assertEqual(intervals[-1][1], stop)
+
+    def test_intervals(self):
+        """ Test the intervals of a range of 0.3 in steps of 0.1 """
+        intervals, _ = _handle_numeric_dimension(1.0, 1.3, 0.1, invert=False)
+        self.assertEqual(len(intervals), 3)
+        for (lower, upper), expected in zip(intervals,
+                                            [(1.0, 1.1), (1.1, 1.2),
+                                             (1.2, 1.3)]):
+            self.assertAlmostEqual(lower, expected[0])
+            self.assertAlmostEqual(upper, expected[1])
+
+    def test_descending_range(self):
+        """ Test that a range with stop < start has no intervals, as before
+        the count was rounded """
+        for invert in [False, True]:
+            with self.subTest(invert=invert):
+                self.assertEqual(
+                    _handle_numeric_dimension(5, 1, 1, invert=invert),
+                    ([], []))
+                self.assertEqual(
+                    _handle_numeric_dimension(1.3, 1.0, 0.1, invert=invert),
+                    ([], []))
+
+    def test_invert(self):
+        """ Test that inverted intervals run from the stop to the start """
+        intervals, _ = _handle_numeric_dimension(0, 10, 3, invert=True)
+        self.assertEqual(intervals,
+                         [[9.0, 10.0], [6.0, 9.0], [3.0, 6.0], [0.0, 3.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+import fsspec
+import numpy as np
+import pandas as pd
+import xarray as xr
+from unittest import mock
+from numcodecs import Blosc
+
+from resampling.object_store import ObjectStore
+from resampling.down_scale import down_scale_in_batches
+from resampling._define_windows import _define_windows
+from resampling._define_windows import _label_positions
+
+# Regular: every window holds 5 x 10 source cells, averaged with coarsen
+regular_resampler = [
+    {"dimension": "latitude", "range": (30, 40), "step": 0.5, "invert": True},
+    {"dimension": "longitude", "range": (-5, 5), "step": 1},
+]
+
+# Irregular: windows of varying size, averaged with the batch kernel
+irregular_resampler = [
+    {"dimension": "latitude", "range": (30, 40), "step": 0.37,
+     "invert": True},
+    {"dimension": "longitude", "range": (-5, 5), "step": 1.3},
+]
+
+
+def _source_dataset() -> xr.Dataset:
+    """ A small chunked dataset on a 0.1 degree grid, with missing values """
+    rng = np.random.default_rng(0)
+    lat = np.arange(30.05, 40, 0.1)
+    lon = np.arange(-5.05, 5, 0.1)
+    time = pd.date_range("2000-01-01", periods=3, freq="YS")
+    shape = (len(time), len(lat), len(lon))
+
+    a = rng.normal(size=shape).astype("float32")
+    a[a > 1.2] = np.nan
+    a[..., :15, :20] = np.nan
+    b = rng.normal(size=shape)
+
+    dims = ("time", "latitude", "longitude")
+    return xr.Dataset(
+        {"a": (dims, a), "b": (dims, b)},
+        coords={"time": time, "latitude": lat, "longitude": lon},
+    ).chunk({"latitude": 37, "longitude": 41})
+
+
+def _expected_means(ds, var, resampler):
+    """ The reference: np.nanmean of every window, selected by label """
+    windows, indices, dimensions = _define_windows(resampler, ds)
+    shape = tuple(len(dimensions[dim]) for dim in indices.dtype.names)
+    expected = np.full(shape, np.nan)
+    values = ds[var].load()
+    for window, index in zip(windows, indices):
+        selected = values.sel({dim: slice(*window[dim])
+                               for dim in windows.dtype.names}).values
+        if np.any(~np.isnan(selected)):
+            expected[tuple(index)] = np.nanmean(selected)
+    return expected, indices.dtype.names
+
+
+class TestDownScaleInBatches(unittest.TestCase):
+
+    def setUp(self):
+        """ An ObjectStore on an in-memory filesystem """
+        self.fs = fsspec.filesystem("memory")
+        self.bucket = f"bucket-{id(self)}"
+        self.fs.mkdir(self.bucket)
+        with mock.patch("resampling.object_store._s3_filesystem",
+                        return_value=self.fs):
+            self.store = ObjectStore(endpoint_url="",
+                                     aws_access_key_id="",
+                                     aws_secret_access_key="",
+                                     aws_session_token="",
+                                     bucket=self.bucket)
+        self.ds = _source_dataset()
+
+    def tearDown(self):
+        self.fs.rm(self.bucket, recursive=True)
+
+    def _down_scale(self, resampler, **kwargs):
+        down_scale_in_batches(ds=self.ds,
+                              my_store=self.store,
+                              dest_zarr="out.zarr",
+                              resampler=resampler,
+                              variables=["a", "b"],
+                              batch_size=37,
+                              workers=2,
+                              logs=False,
+                              **kwargs)
+        return xr.open_zarr(self.fs.get_mapper(f"{self.bucket}/out.zarr"))
+
+    def _assert_means(self, out, resampler, var, rtol=1e-5, atol=1e-6):
+        expected, dims = _expected_means(self.ds, var, resampler)
+        means = out[var].transpose(*dims).values
+        np.testing.assert_allclose(means, expected, rtol=rtol, atol=atol)
+
+    def test_regular_windows(self):
+        """ Test the coarsened means of a regular resampler """
+        out = self._down_scale(regular_resampler)
+        for var in ["a", "b"]:
+            with self.subTest(var=var):
+                self._assert_means(out, regular_resampler, var)
+        self.assertEqual(out["a"].dtype, np.float32)
+
+    def test_irregular_windows(self):
+        """ Test the kernel means of an irregular resampler """
+        for skip_empty in [False, True]:
+            out = self._down_scale(irregular_resampler,
+                                   skip_empty=skip_empty)
+            for var in ["a", "b"]:
+                with self.subTest(var=var, skip_empty=skip_empty):
+                    self._assert_means(out, irregular_resampler, var)
+
+    def test_batch_range(self):
+        """ Test that only the windows of the requested batches are
+        written """
+        for resampler in [regular_resampler, irregular_resampler]:
+            out = self._down_scale(resampler, start_batch=2, end_batch=4)
+            expected, dims = _expected_means(self.ds, "b", resampler)
+            windows, indices, _ = _define_windows(resampler, self.ds)
+            written = np.zeros(expected.shape, dtype=bool)
+            written[tuple(indices[37 * 2:37 * 5][dim] for dim in dims)] = True
+
+            means = out["b"].transpose(*dims).values
+            with self.subTest(resampler=resampler):
+                np.testing.assert_allclose(means[written], expected[written])
+                self.assertTrue(np.all(np.isnan(means[~written])))
+
+    def test_over_write(self):
+        """ Test that an existing destination store is replaced """
+        self._down_scale(regular_resampler)
+        out = self._down_scale(irregular_resampler, over_write=True)
+        self._assert_means(out, irregular_resampler, "b")
+
+    def test_quantized(self):
+        """ Test that quantized variables decode to the means, within half
+        their scale factor """
+        dtype_spec = {"b": ("int16", 0.001, 0.0)}
+        for resampler in [regular_resampler, irregular_resampler]:
+            out = self._down_scale(resampler, dtype_spec=dtype_spec)
+            with self.subTest(resampler=resampler):
+                self.assertEqual(out["b"].encoding["dtype"], np.int16)
+                self.assertEqual(out["b"].encoding["compressor"],
+                                 Blosc(cname="zstd", clevel=5,
+                                       shuffle=Blosc.BITSHUFFLE))
+                self.assertEqual(out["a"].encoding["compressor"],
+                                 Blosc(cname="lz4", clevel=1,
+                                       shuffle=Blosc.BITSHUFFLE))
+                self._assert_means(out, resampler, "b", rtol=0, atol=5e-4)
+                self._assert_means(out, resampler, "a")
+
+
+class TestLabelPositions(unittest.TestCase):
+
+    def test_matches_sel(self):
+        """ Test that the positions select what an inclusive .sel does """
+        rng = np.random.default_rng(0)
+        coord = np.arange(30.05, 40, 0.1)
+        bounds = np.sort(rng.uniform(29, 41, size=(100, 2)), axis=1)
+        # Descending coordinates are selected from the high to the low bound
+        for values, value_bounds in [(coord, bounds),
+                                     (coord[::-1], bounds[:, ::-1])]:
+            da = xr.DataArray(np.arange(values.size), dims="x",
+                              coords={"x": values})
+            positions = _label_positions(values, value_bounds)
+            for (lo, hi), (start, end) in zip(positions, value_bounds):
+                selected = da.sel(x=slice(start, end)).values
+                np.testing.assert_array_equal(np.arange(lo, hi), selected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import numpy as np
+
+from resampling._nanmean_numba import _HAS_NUMBA
+from resampling._nanmean_numba import batch_nanmean
+from resampling._nanmean_numba import _batch_nanmean_numpy
+
+
+def _random_windows(shape, n_windows, rng):
+    """ Random [start, stop) windows, including empty ones """
+    starts = np.stack([rng.integers(0, size, n_windows) for size in shape],
+                      axis=1)
+    stops = np.stack([rng.integers(start, size + 1)
+                      for start, size in zip(starts.T, shape)], axis=1)
+    return starts, stops
+
+
+def _expected_means(arr, starts, stops):
+    """ The reference: np.nanmean of every window, NaN if it is empty """
+    means = np.full(len(starts), np.nan)
+    for w, (start, stop) in enumerate(zip(starts, stops)):
+        values = arr[tuple(slice(lo, hi) for lo, hi in zip(start, stop))]
+        if np.any(~np.isnan(values)):
+            means[w] = np.nanmean(values)
+    return means
+
+
+class TestBatchNanmean(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def _array(self, shape, dtype=np.float64):
+        arr = self.rng.normal(size=shape).astype(dtype)
+        arr[self.rng.random(shape) < 0.3] = np.nan
+        return arr
+
+    def _check(self, mean_function, arr, n_windows=200):
+        starts, stops = _random_windows(arr.shape, n_windows, self.rng)
+        expected = _expected_means(arr.astype(np.float64), starts, stops)
+        means = mean_function(arr, starts, stops)
+        np.testing.assert_allclose(means, expected, rtol=1e-5, atol=1e-6)
+
+    def test_numpy_matches_nanmean(self):
+        """ Test the NumPy fallback against np.nanmean, for 1D to 4D """
+        for shape in [(50,), (20, 30), (6, 15, 17), (3, 4, 5, 6)]:
+            with self.subTest(shape=shape):
+                self._check(_batch_nanmean_numpy, self._array(shape))
+
+    @unittest.skipUnless(_HAS_NUMBA, "numba is not installed")
+    def test_kernel_matches_nanmean(self):
+        """ Test the compiled kernel against np.nanmean, for 1D to 3D """
+        for shape in [(50,), (20, 30), (6, 15, 17)]:
+            with self.subTest(shape=shape):
+                self._check(batch_nanmean, self._array(shape))
+
+    def test_batch_nanmean_matches_nanmean(self):
+        """ Test batch_nanmean with float32, integer and 4D arrays """
+        self._check(batch_nanmean, self._array((20, 30), np.float32))
+        self._check(batch_nanmean,
+                    self.rng.integers(-100, 100, size=(20, 30)))
+        self._check(batch_nanmean, self._array((3, 4, 5, 6)))
+
+    def test_outliers_stay_within_their_window(self):
+        """ Test that an inf or a very large value only affects the windows
+        holding it, in the NumPy fallback and the compiled kernel """
+        starts = np.array([[0, 0], [2, 2], [0, 2]])
+        stops = np.array([[2, 2], [4, 4], [4, 4]])
+        mean_functions = [_batch_nanmean_numpy]
+        if _HAS_NUMBA:
+            mean_functions.append(batch_nanmean)
+
+        for outlier, expected in [(np.inf, [np.inf, 0.1, 0.1]),
+                                  (-np.inf, [-np.inf, 0.1, 0.1]),
+                                  (1e20, [2.5e19, 0.1, 0.1])]:
+            arr = np.full((4, 4), 0.1)
+            arr[0, 0] = outlier
+            for mean_function in mean_functions:
+                with self.subTest(outlier=outlier,
+                                  function=mean_function.__name__):
+                    np.testing.assert_allclose(
+                        mean_function(arr, starts, stops), expected)
+
+        # Both paths agree next to large values on a larger block
+        arr = self._array((40, 50))
+        arr[self.rng.random(arr.shape) < 0.01] = 1e30
+        starts, stops = _random_windows(arr.shape, 200, self.rng)
+        expected = _expected_means(arr, starts, stops)
+        for mean_function in mean_functions:
+            with self.subTest(function=mean_function.__name__):
+                np.testing.assert_allclose(
+                    mean_function(arr, starts, stops), expected, rtol=1e-9)
+
+    def test_all_nan_window(self):
+        """ Test that windows without valid values give NaN """
+        arr = np.full((4, 4), np.nan)
+        arr[0, 0] = 1.0
+        means = batch_nanmean(arr, np.array([[0, 0], [2, 2]]),
+                              np.array([[2, 2], [4, 4]]))
+        np.testing.assert_array_equal(means, [1.0, np.nan])
+
+
+if __name__ == "__main__":
+    unittest.main()
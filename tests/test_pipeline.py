@@ -1,7 +1,8 @@
 import sys
 import os.path
+import pytest
+import unittest
 import xarray as xr
-import pandas as pd
 from pathlib import Path
 
 from resampling.plot_logs import plot_logs
@@ -11,22 +12,12 @@ from resampling.object_store import ObjectStore
 from resampling.down_scale import down_scale_in_batches
 from resampling.down_scale import down_scale_on_the_fly
 
-my_store = store_from_config('path/to/my_config.toml')
-
 endpoint_url=''
 bucket=''
 aws_access_key_id=''
 aws_secret_access_key=''
 aws_session_token=''
 
-my_object_store = ObjectStore(
-    endpoint_url='str',
-    aws_access_key_id='str',
-    aws_secret_access_key='str',
-    aws_session_token='str',
-    bucket='str',
-)
-
 resampler = [
     {"dimension": "latitude",
      "range": (30, 70),
@@ -42,5 +33,22 @@ resampler = [
 url = "https://s3.waw3-1.cloudferro.com/emodnet/emodnet_arco/bio_oracle/sea_water_temperature/sea_water_temperature_bio_oracle_baseline_2000_2019/climatologydecadedepthsurf.zarr"
 var = "average_sea_water_temperature_biooracle_baseline"
 
-ds = xr.open_zarr(url)
-print(ds)
+
+@pytest.mark.network
+class TestPipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """ Open the source dataset once, when the tests run rather than
+        when the module is imported """
+        cls.ds = xr.open_zarr(url, consolidated=True)
+
+    def test_open_zarr(self):
+        """ Test to open the source dataset """
+        self.assertIn(var, self.ds)
+        for resampled in resampler:
+            self.assertIn(resampled["dimension"], self.ds[var].dims)
+
+
+if __name__ == "__main__":
+    unittest.main()